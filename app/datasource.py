@@ -0,0 +1,78 @@
+# app/datasource.py
+"""
+Джерела даних для розрахунку PO.
+
+DataSource — мінімальний інтерфейс, який використовують
+app.stock_manager.build_purchase_order та order_engine.run_engine:
+    read_sales_daily()  -> Series (sku, date) -> qty
+    read_inventory()    -> DataFrame (sku, name, stock)
+    read_stock_grid()   -> «сирий» DataFrame залишків (як Excel без заголовків)
+    read_suppliers()    -> DataFrame довідника постачальників
+    write_tables(dict)  -> запис результатів (назва -> DataFrame)
+
+CsvDataSource — поточна поведінка (CSV/Excel на диску).
+SheetsDataSource — Google Sheets (див. app/sheets.py).
+
+Вибір джерела для точок входу: ENV DATA_SOURCE=csv|sheets (або --source).
+"""
+import os
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+
+class DataSource(ABC):
+    @abstractmethod
+    def read_sales_daily(self) -> pd.Series:
+        ...
+
+    @abstractmethod
+    def read_inventory(self) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def read_stock_grid(self) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def read_suppliers(self) -> pd.DataFrame:
+        ...
+
+    def write_tables(self, tables: dict) -> None:
+        # За замовчуванням джерело лише для читання
+        pass
+
+
+class CsvDataSource(DataSource):
+    def __init__(self, sales_path=None, inv_path=None, stock_path=None, suppliers_path=None):
+        self.sales_path = sales_path
+        self.inv_path = inv_path
+        self.stock_path = stock_path
+        self.suppliers_path = suppliers_path
+
+    def read_sales_daily(self) -> pd.Series:
+        from app.stock_manager import read_sales_daily
+        return read_sales_daily(self.sales_path)
+
+    def read_inventory(self) -> pd.DataFrame:
+        from app.stock_manager import _read_csv_sniffed
+        return _read_csv_sniffed(self.inv_path)
+
+    def read_stock_grid(self) -> pd.DataFrame:
+        import order_engine as oe
+        return oe.read_excel_any(self.stock_path, header=None)
+
+    def read_suppliers(self) -> pd.DataFrame:
+        import order_engine as oe
+        return oe.read_excel_any(self.suppliers_path, header=0)
+
+
+def make_source(kind: str = None, **paths) -> DataSource:
+    """kind (або ENV DATA_SOURCE): "csv" — файли за paths, "sheets" — Google Sheets."""
+    kind = (kind or os.getenv("DATA_SOURCE", "csv")).strip().lower()
+    if kind == "sheets":
+        from app.sheets import SheetsDataSource
+        return SheetsDataSource()
+    if kind == "csv":
+        return CsvDataSource(**paths)
+    raise ValueError(f"Невідоме джерело даних: {kind} (очікується csv або sheets)")
@@ -1,4 +1,227 @@
-# Плейсхолдер для Google Sheets інтеграції.
-# Ідея: додати сервісний акаунт, зчитувати дані 'sales' і 'inventory' із таблиць,
-# замінити джерело CSV на DataFrame з Sheets.
-# На час демо використовується CSV.
\ No newline at end of file
+# app/sheets.py
+"""
+Google Sheets як джерело даних (замість CSV) і місце для результатів.
+
+- Усі діапазони (sales, inventory, залишки, постачальники) читаються
+  одним запитом values:batchGet.
+- Відповідь кешується локально разом із версією файлу з Drive API
+  (files.get?fields=version, з If-None-Match по ETag): поки таблицю
+  не змінили, повторно значення не завантажуються.
+- Результати (PO, відсутні, переміщення) записуються пакетно:
+  values:batchClear + один values:batchUpdate; відсутні аркуші
+  створюються одним spreadsheets:batchUpdate.
+
+ENV:
+- SHEETS_SPREADSHEET_ID — таблиця з вхідними даними
+- SHEETS_OUTPUT_SPREADSHEET_ID — куди писати результати (за замовчуванням та сама)
+- SHEETS_SALES_RANGE=sales, SHEETS_INVENTORY_RANGE=inventory,
+  SHEETS_STOCK_RANGE=stock, SHEETS_SUPPLIERS_RANGE=suppliers
+- GOOGLE_ACCESS_TOKEN або GOOGLE_APPLICATION_CREDENTIALS (сервісний акаунт, потрібен google-auth)
+- SHEETS_API_BASE=https://sheets.googleapis.com/v4
+- DRIVE_API_BASE=https://www.googleapis.com/drive/v3
+- SHEETS_CACHE_DIR=.cache/sheets
+"""
+import os
+import json
+import hashlib
+import threading
+import datetime as dt
+import numpy as np
+import pandas as pd
+import requests
+
+from app.datasource import DataSource
+
+try:
+    from google.oauth2 import service_account
+    from google.auth.transport.requests import Request as _AuthRequest
+except Exception:
+    service_account = None
+
+SHEETS_API_BASE = os.getenv("SHEETS_API_BASE", "https://sheets.googleapis.com/v4").rstrip("/")
+DRIVE_API_BASE = os.getenv("DRIVE_API_BASE", "https://www.googleapis.com/drive/v3").rstrip("/")
+SHEETS_CACHE_DIR = os.getenv("SHEETS_CACHE_DIR", os.path.join(".cache", "sheets"))
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
+          "https://www.googleapis.com/auth/drive.metadata.readonly"]
+
+RANGES = {
+    "sales": os.getenv("SHEETS_SALES_RANGE", "sales"),
+    "inventory": os.getenv("SHEETS_INVENTORY_RANGE", "inventory"),
+    "stock": os.getenv("SHEETS_STOCK_RANGE", "stock"),
+    "suppliers": os.getenv("SHEETS_SUPPLIERS_RANGE", "suppliers"),
+}
+
+
+def access_token() -> str:
+    token = os.getenv("GOOGLE_ACCESS_TOKEN", "")
+    if token:
+        return token
+    key_file = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
+    if key_file and service_account is not None:
+        creds = service_account.Credentials.from_service_account_file(key_file, scopes=SCOPES)
+        creds.refresh(_AuthRequest())
+        return creds.token
+    raise RuntimeError("Немає GOOGLE_ACCESS_TOKEN (або GOOGLE_APPLICATION_CREDENTIALS + google-auth)")
+
+
+def _quote(sheet: str) -> str:
+    return "'" + sheet.replace("'", "''") + "'"
+
+
+def grid_frame(values: list) -> pd.DataFrame:
+    """Рядки Sheets (різної довжини) -> «сира» сітка, порожні клітинки — NaN."""
+    width = max((len(r) for r in values), default=0)
+    rows = [list(r) + [None] * (width - len(r)) for r in values]
+    df = pd.DataFrame(rows, columns=range(width), dtype=object)
+    return df.replace("", np.nan).infer_objects()
+
+
+def header_frame(values: list) -> pd.DataFrame:
+    """Перший рядок — заголовки, далі дані (як read_csv)."""
+    if not values:
+        return pd.DataFrame()
+    grid = grid_frame(values)
+    header = [str(c).strip() if not pd.isna(c) else f"Unnamed: {i}" for i, c in enumerate(grid.iloc[0])]
+    df = grid.iloc[1:].reset_index(drop=True)
+    df.columns = header
+    df = df.dropna(how="all")
+    # Числа, збережені як текст, — у числа (як це робить read_csv)
+    for col in df.columns:
+        num = pd.to_numeric(df[col], errors="coerce")
+        if num.notna().sum() == df[col].notna().sum():
+            df[col] = num
+    return df.reset_index(drop=True)
+
+
+def _cell(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)) or v is pd.NaT:
+        return ""
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, (dt.date, dt.datetime, pd.Timestamp)):
+        return str(v)
+    return v
+
+
+def table_values(df: pd.DataFrame) -> list:
+    rows = [[str(c) for c in df.columns]]
+    rows += [[_cell(v) for v in r] for r in df.itertuples(index=False, name=None)]
+    return rows
+
+
+class SheetsDataSource(DataSource):
+    def __init__(self, spreadsheet_id: str = None, ranges: dict = None, output_spreadsheet_id: str = None,
+                 token: str = None, session: requests.Session = None, cache_dir: str = None):
+        self.spreadsheet_id = spreadsheet_id or os.getenv("SHEETS_SPREADSHEET_ID", "")
+        if not self.spreadsheet_id:
+            raise ValueError("Не задано SHEETS_SPREADSHEET_ID")
+        self.output_id = output_spreadsheet_id or os.getenv("SHEETS_OUTPUT_SPREADSHEET_ID", "") or self.spreadsheet_id
+        self.ranges = dict(RANGES, **(ranges or {}))
+        self.token = token
+        self.session = session or requests.Session()
+        self.cache_dir = cache_dir or SHEETS_CACHE_DIR
+        self._values = None
+
+    # --------- HTTP ---------
+    def _request(self, method: str, url: str, **kw) -> requests.Response:
+        if self.token is None:
+            self.token = access_token()
+        headers = dict(kw.pop("headers", {}), Authorization=f"Bearer {self.token}")
+        r = self.session.request(method, url, headers=headers, timeout=60, **kw)
+        if r.status_code != 304:
+            r.raise_for_status()
+        return r
+
+    # --------- кеш ---------
+    def _cache_path(self) -> str:
+        key = hashlib.sha256(json.dumps([self.spreadsheet_id, sorted(self.ranges.items())]).encode("utf-8"))
+        return os.path.join(self.cache_dir, key.hexdigest()[:32] + ".json")
+
+    def _load_cache(self) -> dict:
+        try:
+            with open(self._cache_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, entry: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path()
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # окремий для кожного потоку
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def revision(self, cached: dict = None):
+        """(version, etag) файлу з Drive; 304 — файл не змінювався."""
+        cached = cached or {}
+        headers = {"If-None-Match": cached["etag"]} if cached.get("etag") else {}
+        r = self._request("GET", f"{DRIVE_API_BASE}/files/{self.spreadsheet_id}",
+                          params={"fields": "version", "supportsAllDrives": "true"}, headers=headers)
+        if r.status_code == 304:
+            return cached.get("version"), cached.get("etag")
+        return str(r.json().get("version", "")), r.headers.get("ETag")
+
+    # --------- читання ---------
+    def values(self) -> dict:
+        """Назва діапазону (sales/inventory/...) -> рядки значень; один batchGet на зміну таблиці."""
+        if self._values is not None:
+            return self._values
+        cached = self._load_cache()
+        version, etag = self.revision(cached)
+        if version and version == cached.get("version") and "values" in cached:
+            print(f"[SHEETS] cache hit v{version}")
+            self._values = cached["values"]
+            return self._values
+
+        names = list(self.ranges)
+        r = self._request("GET", f"{SHEETS_API_BASE}/spreadsheets/{self.spreadsheet_id}/values:batchGet", params={
+            "ranges": [self.ranges[n] for n in names],
+            "valueRenderOption": "UNFORMATTED_VALUE",
+            "dateTimeRenderOption": "FORMATTED_STRING",
+            "majorDimension": "ROWS",
+        })
+        got = r.json().get("valueRanges", [])
+        self._values = {n: (vr.get("values") or []) for n, vr in zip(names, got)}
+        print(f"[SHEETS] fetched v{version or '?'}: " + ", ".join(f"{n}={len(v)}" for n, v in self._values.items()))
+        if version:
+            try:
+                self._save_cache({"version": version, "etag": etag, "values": self._values})
+            except OSError as e:
+                print("[SHEETS CACHE ERROR]", e)
+        return self._values
+
+    def read_sales_daily(self) -> pd.Series:
+        from app.stock_manager import _aggregate_daily
+        return _aggregate_daily([header_frame(self.values()["sales"])])
+
+    def read_inventory(self) -> pd.DataFrame:
+        return header_frame(self.values()["inventory"])
+
+    def read_stock_grid(self) -> pd.DataFrame:
+        return grid_frame(self.values()["stock"])
+
+    def read_suppliers(self) -> pd.DataFrame:
+        return header_frame(self.values()["suppliers"])
+
+    # --------- запис ---------
+    def write_tables(self, tables: dict) -> None:
+        """Назва аркуша -> DataFrame. Аркуш перезаписується повністю."""
+        if not tables:
+            return
+        base = f"{SHEETS_API_BASE}/spreadsheets/{self.output_id}"
+        meta = self._request("GET", base, params={"fields": "sheets.properties.title"}).json()
+        existing = {s["properties"]["title"] for s in meta.get("sheets", [])}
+        missing = [name for name in tables if name not in existing]
+        if missing:
+            self._request("POST", f"{base}:batchUpdate", json={
+                "requests": [{"addSheet": {"properties": {"title": name}}} for name in missing],
+            })
+        ranges = [_quote(name) for name in tables]
+        self._request("POST", f"{base}/values:batchClear", json={"ranges": ranges})
+        self._request("POST", f"{base}/values:batchUpdate", json={
+            "valueInputOption": "RAW",
+            "data": [{"range": f"{rng}!A1", "majorDimension": "ROWS", "values": table_values(df)}
+                     for rng, df in zip(ranges, tables.values())],
+        })
+        print(f"[SHEETS] written: {', '.join(tables)}")
@@ -0,0 +1,208 @@
+# app/simulator.py
+"""
+What-if симулятор параметрів поповнення.
+
+Беремо історію продажів (формат sample_data/sales.csv: date, sku, qty),
+генеруємо Monte Carlo траєкторії попиту (bootstrap із денних продажів SKU)
+і програємо сітку параметрів:
+    lead_days × safety_days × target_cover_days × limit_scale
+
+Політика (щоденний перегляд, втрачені продажі):
+    точка замовлення  s = avg × (lead + safety)
+    ліміт (order-up-to) S = max(s, рівень × limit_scale), де рівень —
+        фактичний Ліміт SKU (колонка limit/ліміт в inventory або --limits),
+        а без нього — avg × (lead + safety + cover)
+    якщо залишок + в дорозі < s → замовити S - (залишок + в дорозі),
+    замовлення приходить через lead днів.
+
+Усі конфігурації, траєкторії та SKU рахуються одночасно масивами
+(config × path × sku), цикл лише по днях горизонту. Конфігурації
+обробляються порціями, щоб обмежити пам'ять.
+
+Запуск:
+    python -m app.simulator --sales sample_data/sales.csv --inventory sample_data/inventory.csv
+    python -m app.simulator --sales ... --inventory ... --limits limits.csv   # sku, limit
+"""
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+
+from app.config import DEFAULT_LEAD_DAYS, DEFAULT_SAFETY_DAYS, TARGET_DAYS_OF_COVER
+from app.stock_manager import _normalize_sales
+
+# Максимум елементів (config × path × sku) в одній порції
+CHUNK_ELEMENTS = 500_000
+# Назви колонки з фактичним лімітом SKU
+LIMIT_COLUMNS = ["limit", "ліміт", "order_up_to", "max_stock"]
+
+
+def daily_matrix(sales_df: pd.DataFrame):
+    """Продажі -> (список SKU, матриця SKU × день) з нулями у дні без продажів."""
+    sales = _normalize_sales(sales_df).copy()
+    sales["date"] = pd.to_datetime(sales["date"]).dt.normalize()
+    sales["qty"] = pd.to_numeric(sales["qty"], errors="coerce").fillna(0)
+    table = sales.pivot_table(index="sku", columns="date", values="qty", aggfunc="sum", fill_value=0)
+    days = pd.date_range(table.columns.min(), table.columns.max(), freq="D")
+    table = table.reindex(columns=days, fill_value=0)
+    return table.index.tolist(), table.to_numpy(dtype=np.float32)
+
+
+def sample_demand(hist: np.ndarray, paths: int, horizon: int, seed: int = 0) -> np.ndarray:
+    """Bootstrap денних продажів: (path × sku × day)."""
+    rng = np.random.default_rng(seed)
+    n_sku, n_days = hist.shape
+    idx = rng.integers(0, n_days, size=(paths, n_sku, horizon))
+    return hist[np.arange(n_sku)[None, :, None], idx]
+
+
+def param_grid(lead_days, safety_days, cover_days, limit_scales) -> pd.DataFrame:
+    rows = list(itertools.product(lead_days, safety_days, cover_days, limit_scales))
+    return pd.DataFrame(rows, columns=["lead_days", "safety_days", "target_cover_days", "limit_scale"])
+
+
+def _simulate_chunk(grid: pd.DataFrame, avg: np.ndarray, start: np.ndarray, demand: np.ndarray,
+                    limit: np.ndarray = None):
+    """grid — C конфігурацій; avg/start/limit — (sku,), limit NaN — ліміту немає; demand — (path, sku, day)."""
+    lead = grid["lead_days"].to_numpy(dtype=int)
+    safety = grid["safety_days"].to_numpy(dtype=np.float32)
+    cover = grid["target_cover_days"].to_numpy(dtype=np.float32)
+    scale = grid["limit_scale"].to_numpy(dtype=np.float32)
+
+    C = len(grid)
+    P, S, H = demand.shape
+    reorder = (avg[None, :] * (lead + safety)[:, None])[:, None, :]                     # (C, 1, S)
+    level = avg[None, :] * (lead + safety + cover)[:, None]                             # (C, S)
+    if limit is not None:
+        level = np.where(np.isnan(limit)[None, :], level, limit[None, :])
+    up_to = np.maximum(reorder, (level * scale[:, None])[:, None, :])
+
+    on_hand = np.empty((C, P, S), dtype=np.float32)
+    on_hand[...] = start
+    daily = np.ascontiguousarray(demand.transpose(2, 0, 1))  # (day, path, sku) — суцільні зрізи по днях
+    ring = int(lead.max()) + 1
+    pipeline = np.zeros((ring, C, P, S), dtype=np.float32)   # надходження по днях (кільцевий буфер)
+    on_order = np.zeros((C, P, S), dtype=np.float32)
+    cfg = np.arange(C)
+
+    stockout_days = np.zeros(C)
+    lost = np.zeros(C)
+    inv_sum = np.zeros(C)
+    orders = np.zeros(C)
+
+    for t in range(H):
+        slot = t % ring
+        arrived = pipeline[slot]
+        on_hand += arrived
+        on_order -= arrived
+        arrived[...] = 0
+
+        # Втрачені продажі: дефіцит = max(попит - залишок, 0)
+        on_hand -= daily[t]
+        short = np.maximum(-on_hand, 0).reshape(C, -1)
+        np.maximum(on_hand, 0, out=on_hand)
+        stockout_days += np.count_nonzero(short, axis=1)
+        lost += short.sum(axis=1)
+        inv_sum += on_hand.reshape(C, -1).sum(axis=1)
+
+        position = on_hand + on_order
+        qty = up_to - position
+        qty[position >= reorder] = 0
+        orders += np.count_nonzero(qty.reshape(C, -1), axis=1)
+        # lead = 0 — надходить наступного дня
+        pipeline[(t + np.maximum(lead, 1)) % ring, cfg] += qty
+        on_order += qty
+
+    total_demand = max(float(demand.sum()), 1e-9)
+    out = grid.copy()
+    out["stockout_rate"] = stockout_days / (P * S * H)
+    out["lost_sales_rate"] = lost / total_demand
+    out["avg_inventory"] = inv_sum / (P * H)          # сумарно по SKU, у середньому за день
+    out["orders_per_sku_week"] = orders / (P * S * H) * 7
+    return out
+
+
+def simulate(sales_df: pd.DataFrame, inv_df: pd.DataFrame = None, grid: pd.DataFrame = None,
+             paths: int = 200, horizon: int = 28, seed: int = 0, limits: pd.Series = None) -> pd.DataFrame:
+    """
+    Повертає таблицю: параметри конфігурації + stockout_rate, lost_sales_rate,
+    avg_inventory, orders_per_sku_week (відсортовано: менше дефіциту, менше запасу).
+    limits — фактичні ліміти (sku -> кількість); інакше беруться з колонки
+    limit/ліміт в inv_df. limit_scale тоді масштабує саме їх.
+    """
+    skus, hist = daily_matrix(sales_df)
+    avg = hist.mean(axis=1).astype(np.float32)
+
+    start = None
+    if inv_df is not None:
+        inv = inv_df.rename(columns={c: c.strip().lower() for c in inv_df.columns})
+        if "stock" not in inv.columns and "on_hand" in inv.columns:
+            inv = inv.rename(columns={"on_hand": "stock"})
+        inv = inv.set_index("sku")
+        if "stock" in inv.columns:
+            start = inv["stock"].reindex(skus).fillna(0).to_numpy(dtype=np.float32)
+        col = next((c for c in LIMIT_COLUMNS if c in inv.columns), None)
+        if limits is None and col:
+            limits = inv[col]
+    limit = None
+    if limits is not None:
+        limit = pd.to_numeric(limits, errors="coerce").reindex(skus).to_numpy(dtype=np.float32)
+    if grid is None:
+        grid = param_grid(
+            sorted({max(DEFAULT_LEAD_DAYS - 1, 1), DEFAULT_LEAD_DAYS, DEFAULT_LEAD_DAYS + 1}),
+            sorted({max(DEFAULT_SAFETY_DAYS - 1, 0), DEFAULT_SAFETY_DAYS, DEFAULT_SAFETY_DAYS + 1, DEFAULT_SAFETY_DAYS + 2}),
+            sorted({max(TARGET_DAYS_OF_COVER - 1, 1), TARGET_DAYS_OF_COVER, TARGET_DAYS_OF_COVER + 2, TARGET_DAYS_OF_COVER + 4}),
+            [0.8, 1.0, 1.2],
+        )
+    grid = grid.reset_index(drop=True)
+    if start is None:
+        # Без інвентаря стартуємо з рівня ліміту базової конфігурації
+        start = avg * float(DEFAULT_LEAD_DAYS + DEFAULT_SAFETY_DAYS + TARGET_DAYS_OF_COVER)
+
+    demand = sample_demand(hist, paths, horizon, seed=seed)
+    chunk = max(1, CHUNK_ELEMENTS // max(paths * len(skus), 1))
+    parts = [_simulate_chunk(grid.iloc[i:i + chunk], avg, start, demand, limit)
+             for i in range(0, len(grid), chunk)]
+    res = pd.concat(parts, ignore_index=True)
+    return res.sort_values(["stockout_rate", "avg_inventory"]).reset_index(drop=True)
+
+
+def _ints(s):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def _floats(s):
+    return [float(x) for x in s.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="What-if симуляція лімітів і термінів поставки")
+    parser.add_argument("--sales", required=True, help="Path to sales CSV")
+    parser.add_argument("--inventory", required=False, help="Path to inventory CSV (стартові залишки, опційно limit)")
+    parser.add_argument("--limits", required=False, help="CSV з фактичними лімітами: sku, limit")
+    parser.add_argument("--lead", default="1,2,3,4")
+    parser.add_argument("--safety", default="0,1,2,3")
+    parser.add_argument("--cover", default="2,3,5,7")
+    parser.add_argument("--limit-scale", default="0.8,1.0,1.2")
+    parser.add_argument("--paths", type=int, default=200)
+    parser.add_argument("--horizon", type=int, default=28)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="", help="Зберегти результати у CSV")
+    args = parser.parse_args()
+
+    sales = pd.read_csv(args.sales)
+    inv = pd.read_csv(args.inventory) if args.inventory else None
+    limits = None
+    if args.limits:
+        lim = pd.read_csv(args.limits)
+        lim = lim.rename(columns={c: c.strip().lower() for c in lim.columns})
+        limits = lim.set_index("sku")[next(c for c in LIMIT_COLUMNS if c in lim.columns)]
+    grid = param_grid(_ints(args.lead), _ints(args.safety), _ints(args.cover), _floats(args.limit_scale))
+    res = simulate(sales, inv, grid, paths=args.paths, horizon=args.horizon, seed=args.seed, limits=limits)
+    if args.out:
+        res.to_csv(args.out, index=False, encoding="utf-8")
+    print(res.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,22 @@
+import codecs
+import glob
+import gzip
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow опційний — тоді читаємо pandas-чанками
+    pa = None
+
+# Розмір порції при потоковому читанні sales
+SALES_CHUNK_ROWS = 200_000
+SALES_BLOCK_BYTES = 8 << 20
+# Скільки агрегованих порцій накопичувати перед злиттям
+_MERGE_EVERY = 16
+# Назва таблиці/аркуша для запису PO у джерело даних
+PO_SHEET = "PO"
+
 def _normalize_sales(df: pd.DataFrame) -> pd.DataFrame:
     # Нормалізація назв колонок у sales
     df = df.rename(columns={c: c.strip().lower() for c in df.columns})
@@ -38,10 +55,123 @@ def _normalize_inventory(df: pd.DataFrame) -> pd.DataFrame:
     return df[["sku", "name", "stock"]]
 
 
-def _daily_avg(sales_df: pd.DataFrame) -> pd.Series:
-    sales_df = _normalize_sales(sales_df)
-    daily = sales_df.groupby("sku")["qty"].mean().rename("avg_daily_qty")
-    return daily
+def _sales_paths(sales_path) -> list:
+    # Один файл, список файлів або glob-шаблон ("exports/sales_*.csv.gz")
+    if isinstance(sales_path, (list, tuple)):
+        paths = [str(p) for p in sales_path]
+    elif any(ch in str(sales_path) for ch in "*?["):
+        paths = sorted(glob.glob(str(sales_path)))
+    else:
+        paths = [str(sales_path)]
+    if not paths:
+        raise FileNotFoundError(f"Не знайдено файлів sales за шаблоном {sales_path}")
+    return paths
+
+
+def _open_binary(path: str):
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _sniff_encoding(path: str, probe_bytes: int = 65536) -> str:
+    # Визначаємо кодування за першими байтами — файл читається лише один раз
+    with _open_binary(path) as f:
+        head = f.read(probe_bytes)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Обрізаний багатобайтовий символ у кінці проби — це ще UTF-8
+        if e.start < len(head) - 3:
+            return "cp1251"
+    return "utf-8"
+
+
+def _is_decode_error(e: Exception) -> bool:
+    # pandas кидає UnicodeDecodeError, pyarrow — ArrowInvalid «invalid UTF8 data»
+    return isinstance(e, UnicodeDecodeError) or (pa is not None and isinstance(e, pa.ArrowInvalid)
+                                                 and "utf8" in str(e).lower())
+
+
+def _read_csv_sniffed(path: str) -> pd.DataFrame:
+    encoding = _sniff_encoding(path)
+    try:
+        return pd.read_csv(path, encoding=encoding)
+    except UnicodeDecodeError:
+        # Перші байти були ASCII, а cp1251 почався далі — як у базовій версії
+        return pd.read_csv(path, encoding="cp1251")
+
+
+def _iter_sales_chunks(path: str, encoding: str):
+    if pa is not None:
+        # pyarrow: потоковий reader по блоках; всі колонки як рядки, щоб
+        # тип не «стрибав» між блоками. Назви колонок — зі схеми reader-а
+        # (лапки й коми в заголовку розбирає сам парсер CSV)
+        pa_encoding = "utf8" if encoding.startswith("utf-8") else encoding
+        with _open_binary(path) as probe:
+            names = pacsv.open_csv(
+                probe, read_options=pacsv.ReadOptions(encoding=pa_encoding, block_size=1 << 16),
+            ).schema.names
+        src = _open_binary(path)
+        try:
+            reader = pacsv.open_csv(
+                src,
+                read_options=pacsv.ReadOptions(encoding=pa_encoding, block_size=SALES_BLOCK_BYTES),
+                convert_options=pacsv.ConvertOptions(column_types={n: pa.string() for n in names}),
+            )
+            for batch in reader:
+                yield batch.to_pandas()
+        finally:
+            src.close()
+    else:
+        yield from pd.read_csv(path, encoding=encoding, dtype=str,
+                               chunksize=SALES_CHUNK_ROWS, compression="infer")
+
+
+def _merge_daily(parts: list) -> pd.Series:
+    if not parts:
+        return pd.Series(dtype=float, name="qty",
+                         index=pd.MultiIndex.from_tuples([], names=["sku", "date"]))
+    return pd.concat(parts).groupby(level=["sku", "date"]).sum()
+
+
+def _aggregate_daily(chunks) -> pd.Series:
+    # Інкрементально: кожну порцію згортаємо до (sku, date) -> qty і періодично зливаємо
+    parts = []
+    for chunk in chunks:
+        chunk = _normalize_sales(chunk)
+        chunk = chunk.assign(
+            sku=chunk["sku"].astype(str).str.strip(),
+            date=pd.to_datetime(chunk["date"], errors="coerce").dt.normalize(),
+            qty=pd.to_numeric(chunk["qty"], errors="coerce").fillna(0),
+        ).dropna(subset=["date"])
+        parts.append(chunk.groupby(["sku", "date"])["qty"].sum())
+        if len(parts) >= _MERGE_EVERY:
+            parts = [_merge_daily(parts)]
+    return _merge_daily(parts)
+
+
+def _read_sales_file(path: str) -> pd.Series:
+    encoding = _sniff_encoding(path)
+    try:
+        return _aggregate_daily(_iter_sales_chunks(path, encoding))
+    except Exception as e:
+        # Проба (перші 64 КБ) була ASCII, а cp1251 трапився далі — перечитуємо
+        # файл повністю як cp1251; для звичайних файлів це все ще один прохід
+        if encoding == "cp1251" or not _is_decode_error(e):
+            raise
+        print(f"[SALES] {path}: не UTF-8 після проби, перечитуємо як cp1251")
+        return _aggregate_daily(_iter_sales_chunks(path, "cp1251"))
+
+
+def read_sales_daily(sales_path) -> pd.Series:
+    """
+    Потокове читання sales (один/кілька файлів, glob, .gz) з агрегацією
+    до денних сум. Пам'ять — O(кількість пар sku × день), а не розмір файлів.
+    """
+    return _merge_daily([_read_sales_file(path) for path in _sales_paths(sales_path)])
 
 
 def _calc_po(df: pd.DataFrame, safety_days: float = 2.0) -> pd.DataFrame:
@@ -52,24 +182,24 @@ def _calc_po(df: pd.DataFrame, safety_days: float = 2.0) -> pd.DataFrame:
     return po
 
 
-def build_purchase_order(sales_path: str, inv_path: str):
-    # Читаємо sales з fallback на cp1251
-    try:
-        sales = pd.read_csv(sales_path, encoding="utf-8")
-    except UnicodeDecodeError:
-        sales = pd.read_csv(sales_path, encoding="cp1251")
+def build_purchase_order(sales_path=None, inv_path: str = None, source=None):
+    # source — будь-який app.datasource.DataSource (CSV, Google Sheets);
+    # без нього — CSV за шляхами, як раніше
+    if source is None:
+        from app.datasource import CsvDataSource
+        source = CsvDataSource(sales_path, inv_path)
 
-    # Читаємо inventory з fallback на cp1251
-    try:
-        inv = pd.read_csv(inv_path, encoding="utf-8")
-    except UnicodeDecodeError:
-        inv = pd.read_csv(inv_path, encoding="cp1251")
+    # sales — потоково (кодування визначається за першими байтами, без повторного читання)
+    daily = source.read_sales_daily()
+    daily_avg = daily.groupby(level="sku").mean().rename("avg_daily_qty")
 
-    inv = _normalize_inventory(inv)
-    daily_avg = _daily_avg(sales)
+    inv = _normalize_inventory(source.read_inventory())
+    inv["sku"] = inv["sku"].astype(str).str.strip()
 
     merged = inv.merge(daily_avg, on="sku", how="left").fillna({"avg_daily_qty": 0})
     po = _calc_po(merged)
+    # Результат — назад у джерело (Sheets: аркуш PO; CSV — нічого не робить)
+    source.write_tables({PO_SHEET: po})
 
     # Підсумок у вигляді тексту
     if len(po):
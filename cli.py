@@ -2,6 +2,7 @@ import argparse
 import os
 from dotenv import load_dotenv
 
+from app.datasource import make_source
 from app.stock_manager import build_purchase_order
 from app.ai_layer import generate_supplier_message
 from app.emailer import send_email
@@ -12,13 +13,18 @@ def main():
     load_dotenv()
 
     parser = argparse.ArgumentParser(description="AI Beer Stock Manager CLI")
-    parser.add_argument("--sales", required=True, help="Path to sales CSV")
-    parser.add_argument("--inventory", required=True, help="Path to inventory CSV")
+    parser.add_argument("--source", choices=["csv", "sheets"], default=os.getenv("DATA_SOURCE", "csv"),
+                        help="Звідки брати sales/inventory (sheets — Google Sheets, див. app/sheets.py)")
+    parser.add_argument("--sales", required=False, help="Path to sales CSV (для --source csv)")
+    parser.add_argument("--inventory", required=False, help="Path to inventory CSV (для --source csv)")
     parser.add_argument("--supplier-email", required=False, default=os.getenv("SUPPLIER_EMAIL", ""))
     args = parser.parse_args()
+    if args.source == "csv" and not (args.sales and args.inventory):
+        parser.error("--sales та --inventory обов'язкові для --source csv")
 
-    # 1) Розрахунок потреби та формування PO-таблиці
-    po_df, summary = build_purchase_order(args.sales, args.inventory)
+    # 1) Розрахунок потреби та формування PO-таблиці (для Sheets — ще й запис аркуша PO)
+    source = make_source(args.source, sales_path=args.sales, inv_path=args.inventory)
+    po_df, summary = build_purchase_order(source=source)
 
     # 2) AI-генерація “людяного” повідомлення постачальнику
     try:
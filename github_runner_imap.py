@@ -3,21 +3,27 @@
 import os, re, io, imaplib, email, pathlib, pandas as pd, sys
 sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
 import order_engine as oe
+import stock_cache
 
 IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
 IMAP_USER = os.getenv("IMAP_USER", "")
 IMAP_PASSWORD = os.getenv("IMAP_PASSWORD", "")
 IMAP_FOLDER = os.getenv("IMAP_FOLDER", "INBOX")
-IMAP_FILENAME_REGEX = os.getenv("IMAP_FILENAME_REGEX", r"export_limits.*\.(xlsx|xls)$")
+IMAP_FILENAME_REGEX = os.getenv("IMAP_FILENAME_REGEX", r"export_limits.*\.(xlsx|xls|ods|csv|tsv)$")
 
-oe.TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
-oe.TELEGRAM_CHAT_ID   = os.getenv("TELEGRAM_CHAT_ID", "")
-oe.DRY_RUN = int(os.getenv("DRY_RUN", "0"))
-oe.OUT_DIR = os.getenv("OUT_DIR", "out")
+CFG = oe.EngineConfig.from_env(
+    out_dir=os.getenv("OUT_DIR", "out"),
+    dry_run=int(os.getenv("DRY_RUN", "0")),
+    telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN", ""),
+    telegram_chat_id=os.getenv("TELEGRAM_CHAT_ID", ""),
+)
+# Кожен запуск — своя підпапка OUT_DIR/<RUN_ID>, паралельні джоби не перетирають файли
+RUN_ID = os.getenv("RUN_ID") or oe.new_run_id()
 SUPPLIERS_PATH = os.getenv("SUPPLIERS_PATH", "suppliers.csv")
-os.makedirs(oe.OUT_DIR, exist_ok=True)
+# DATA_SOURCE=sheets — постачальники з Google Sheets, результати пишуться туди ж
+DATA_SOURCE = os.getenv("DATA_SOURCE", "csv").strip().lower()
 
-def fetch_latest_attachment():
+def fetch_latest_attachment(out_dir):
     regex = re.compile(IMAP_FILENAME_REGEX, re.I)
     M = imaplib.IMAP4_SSL(IMAP_HOST, 993); M.login(IMAP_USER, IMAP_PASSWORD)
     typ,_ = M.select(IMAP_FOLDER)
@@ -37,7 +43,7 @@ def fetch_latest_attachment():
             dh = email.header.decode_header(raw)
             fname = "".join([(t[0].decode(t[1] or 'utf-8') if isinstance(t[0],bytes) else str(t[0])) for t in dh])
             if not regex.search(fname): continue
-            path = os.path.join(oe.OUT_DIR, fname)
+            path = os.path.join(out_dir, fname)
             with open(path,"wb") as f: f.write(part.get_payload(decode=True))
             M.close(); M.logout(); print("[IMAP] Downloaded:", fname); return path
     M.close(); M.logout(); raise RuntimeError(f"IMAP: не знайдено вкладення за regex {IMAP_FILENAME_REGEX}")
@@ -59,31 +65,32 @@ def line_for_store(name: str, df_po: pd.DataFrame) -> str:
     return f"Магазин {name}: {len(df_po)} позицій, постачальників: {supp}, підсумок: {totals_text(df_po)}."
 
 def main():
-    stock_path = fetch_latest_attachment()
-    sup_raw = oe.read_excel_any(SUPPLIERS_PATH, header=0) if SUPPLIERS_PATH.lower().endswith((".xls",".xlsx")) else pd.read_csv(SUPPLIERS_PATH)
-    df_sup = oe.load_suppliers(sup_raw)
-    df_stock = oe.read_stock_excel(stock_path)
-    po_a, po_b, missing = oe.compute_orders_and_missing(df_stock, df_sup)
+    run_dir = os.path.join(CFG.out_dir, RUN_ID)
+    os.makedirs(run_dir, exist_ok=True)
+    stock_path = fetch_latest_attachment(run_dir)
+    with open(stock_path, "rb") as f: stock_bytes = f.read()
+    df_stock = stock_cache.cached_parse(stock_bytes, oe.read_stock_excel)
+    print(stock_cache.stats_line())
 
-    # Save XLSX
-    if not po_a.empty:
-        oe.save_xlsx(po_a, os.path.join(oe.OUT_DIR, "PO_Боголюбова.xlsx"))
-    if not po_b.empty:
-        oe.save_xlsx(po_b, os.path.join(oe.OUT_DIR, "PO_Європейська_31а.xlsx"))
-    if not missing.empty:
-        oe.save_xlsx(missing, os.path.join(oe.OUT_DIR, "MISSING_SUPPLIERS.xlsx"))
+    # Розрахунок + XLSX у run_dir (без відправки — текст підсумку свій)
+    if DATA_SOURCE == "sheets":
+        from app.datasource import make_source
+        res = oe.run_engine(df_stock, None, CFG, run_id=RUN_ID, send=False, source=make_source("sheets"))
+    else:
+        res = oe.run_engine(df_stock, SUPPLIERS_PATH, CFG, run_id=RUN_ID, send=False)
 
     # Summary (реальні дані)
-    summary = f"{line_for_store(oe.STORE_A_NAME, po_a)}\n{line_for_store(oe.STORE_B_NAME, po_b)}"
+    summary = f"{line_for_store(oe.STORE_A_NAME, res.po_a)}\n{line_for_store(oe.STORE_B_NAME, res.po_b)}"
+    if not res.transfers.empty:
+        summary += f"\nПереміщення між магазинами: {len(res.transfers)} позицій."
+    if not res.deferred.empty:
+        summary += f"\nВідкладено (нижче мінімуму): {len(res.deferred)} позицій."
     print("[SUMMARY]\n", summary)
 
     # Send to Telegram
-    from order_engine import tg_send_message, tg_send_document
-    tg_send_message(f"<b>AI Beer Stock Manager</b>\n{summary}")
-    for fname in ["PO_Боголюбова.xlsx","PO_Європейська_31а.xlsx","MISSING_SUPPLIERS.xlsx"]:
-        p = os.path.join(oe.OUT_DIR, fname)
-        if os.path.exists(p):
-            tg_send_document(p, caption=f"<code>{fname}</code>")
+    oe.tg_send_message(f"<b>AI Beer Stock Manager</b>\n{summary}", cfg=CFG)
+    for p in res.files.values():
+        oe.tg_send_document(p, caption=f"<code>{os.path.basename(p)}</code>", cfg=CFG)
 
 if __name__ == "__main__":
     main()
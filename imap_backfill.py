@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Історичний бекфіл export_limits із пошти в архів знімків залишків.
+
+- Діапазон UID (з фільтром SINCE/BEFORE) ділиться між кількома
+  паралельними IMAP-з'єднаннями (потоки)
+- Для кожного листа спершу тягнемо лише BODYSTRUCTURE, далі — тільки
+  потрібні частини-вкладення (BODY.PEEK[<part>]), без повного RFC822
+- Парсинг Excel — у пулі процесів (spawn); однакові вкладення (той самий
+  SHA-256) парсяться один раз, але знімок пишеться для кожного листа —
+  незмінний експорт за інший день не лишає «дірок» в історії
+- Кожен знімок — окремий файл у ARCHIVE_DIR: <YYYY-MM-DD>_<uid>.parquet
+  (zstd; без pyarrow — .pkl.gz) з колонками snapshot_date, uid, filename
+- Чекпойнт (_checkpoint.json) зберігає оброблені UID і UIDVALIDITY —
+  повторний запуск продовжує з місця зупинки
+
+Запуск:
+    python imap_backfill.py --since 2025-01-01 --workers 4 --procs 4
+
+ENV:
+- IMAP_HOST, IMAP_PORT=993, IMAP_SSL=1|0, IMAP_USER, IMAP_PASSWORD, IMAP_FOLDER
+- IMAP_FILENAME_REGEX (як у github_runner_imap)
+- ARCHIVE_DIR=archive/stock
+"""
+
+import os, re, sys, json, glob, base64, quopri, pathlib, imaplib, threading, datetime as dt
+import email.header, urllib.parse, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+import order_engine as oe
+import stock_cache
+
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_SSL = int(os.getenv("IMAP_SSL", "1"))
+IMAP_USER = os.getenv("IMAP_USER", "")
+IMAP_PASSWORD = os.getenv("IMAP_PASSWORD", "")
+IMAP_FOLDER = os.getenv("IMAP_FOLDER", "INBOX")
+IMAP_FILENAME_REGEX = os.getenv("IMAP_FILENAME_REGEX", r"export_limits.*\.(xlsx|xls|ods|csv|tsv)$")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join("archive", "stock"))
+
+FETCH_BATCH = 200          # UID на один запит BODYSTRUCTURE
+MAX_IN_FLIGHT = 32         # вкладень одночасно в пулі процесів (обмеження пам'яті)
+CHECKPOINT_NAME = "_checkpoint.json"
+
+try:
+    import pyarrow  # noqa
+    SNAPSHOT_EXT = ".parquet"
+except Exception:
+    SNAPSHOT_EXT = ".pkl.gz"
+
+
+# --------- IMAP ---------
+def connect():
+    M = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT) if IMAP_SSL else imaplib.IMAP4(IMAP_HOST, IMAP_PORT)
+    M.login(IMAP_USER, IMAP_PASSWORD)
+    typ, _ = M.select(IMAP_FOLDER, readonly=True)
+    if typ != "OK":
+        raise RuntimeError(f"IMAP: не вдалось відкрити {IMAP_FOLDER}")
+    return M
+
+
+def _imap_date(d: dt.date) -> str:
+    return d.strftime("%d-%b-%Y") if hasattr(d, "strftime") else str(d)
+
+
+def list_uids(M, since=None, before=None):
+    """(UIDVALIDITY, відсортовані UID) з фільтром дат."""
+    typ, data = M.response("UIDVALIDITY")
+    uidvalidity = int(data[0]) if data and data[0] else 0
+    crit = []
+    if since: crit += ["SINCE", _imap_date(since)]
+    if before: crit += ["BEFORE", _imap_date(before)]
+    typ, data = M.uid("SEARCH", *(crit or ["ALL"]))
+    if typ != "OK":
+        raise RuntimeError("IMAP: search failed")
+    return uidvalidity, sorted(int(u) for u in data[0].split())
+
+
+# --------- розбір відповіді FETCH (S-вирази IMAP) ---------
+_TOKEN = re.compile(rb'\(|\)|"(?:\\.|[^"\\])*"|[^\s()"]+')
+
+
+def _flatten(data) -> bytes:
+    # Літерали {n} підставляємо як рядки в лапках — далі все парситься одним токенайзером
+    out = []
+    for item in data:
+        if isinstance(item, tuple):
+            head, lit = item
+            head = re.sub(rb"\{\d+\}$", b"", head)
+            out.append(head + b'"' + lit.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"')
+        elif item:
+            out.append(item)
+    return b" ".join(out)
+
+
+def _parse_sexp(raw: bytes) -> list:
+    stack = [[]]
+    for tok in _TOKEN.findall(raw):
+        if tok == b"(":
+            stack.append([])
+        elif tok == b")":
+            lst = stack.pop()
+            stack[-1].append(lst)
+        elif tok.startswith(b'"'):
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", tok[1:-1]).decode("utf-8", "replace"))
+        else:
+            s = tok.decode("ascii", "replace")
+            stack[-1].append(None if s.upper() == "NIL" else s)
+    return stack[0]
+
+
+def parse_fetch(data) -> dict:
+    """Відповідь UID FETCH -> {uid: {"INTERNALDATE": ..., "BODYSTRUCTURE": [...]}}"""
+    out = {}
+    items = _parse_sexp(_flatten(data))
+    for item in items:
+        if not isinstance(item, list):
+            continue
+        attrs = {str(item[i]).upper(): item[i + 1] for i in range(0, len(item) - 1, 2)}
+        if "UID" in attrs:
+            out[int(attrs["UID"])] = attrs
+    return out
+
+
+def _decode_filename(val: str, rfc2231: bool = False) -> str:
+    if rfc2231:
+        charset, _, rest = val.partition("'")
+        _, _, encoded = rest.partition("'")
+        return urllib.parse.unquote(encoded, encoding=charset or "utf-8", errors="replace")
+    parts = email.header.decode_header(val)
+    return "".join(t.decode(c or "utf-8", "replace") if isinstance(t, bytes) else t for t, c in parts)
+
+
+def _find_filename(part) -> str:
+    found = {}
+    def walk(x):
+        if not isinstance(x, list):
+            return
+        for i in range(len(x) - 1):
+            k = x[i]
+            if isinstance(k, str) and k.upper() in ("FILENAME", "FILENAME*", "NAME", "NAME*") and isinstance(x[i + 1], str):
+                found.setdefault(k.upper(), x[i + 1])
+        for y in x:
+            walk(y)
+    walk(part)
+    for key in ("FILENAME*", "FILENAME", "NAME*", "NAME"):
+        if key in found:
+            return _decode_filename(found[key], rfc2231=key.endswith("*"))
+    return ""
+
+
+def iter_parts(bs, prefix=""):
+    """(номер частини, опис частини) для кожної не-multipart частини BODYSTRUCTURE."""
+    if isinstance(bs, list) and bs and isinstance(bs[0], list):
+        n = 0
+        for child in bs:
+            if not isinstance(child, list):
+                break  # далі йде підтип multipart і параметри
+            n += 1
+            yield from iter_parts(child, f"{prefix}.{n}" if prefix else str(n))
+    elif isinstance(bs, list):
+        yield prefix or "1", bs
+
+
+def matching_parts(bs, regex) -> list:
+    """[(part, filename, encoding)] для вкладень, що збігаються з regex."""
+    out = []
+    for part, desc in iter_parts(bs):
+        fname = _find_filename(desc)
+        if fname and regex.search(fname):
+            enc = str(desc[5]).upper() if len(desc) > 5 and desc[5] else "7BIT"
+            out.append((part, fname, enc))
+    return out
+
+
+def _decode_payload(raw: bytes, encoding: str) -> bytes:
+    if encoding == "BASE64":
+        return base64.b64decode(raw)
+    if encoding == "QUOTED-PRINTABLE":
+        return quopri.decodestring(raw)
+    return raw
+
+
+def _parse_internaldate(s) -> dt.date:
+    try:
+        return dt.datetime.strptime(str(s).strip(), "%d-%b-%Y %H:%M:%S %z").date()
+    except ValueError:
+        return dt.date.today()
+
+
+def fetch_parts(M, uids, part):
+    """UID FETCH набору листів з однаковим номером частини -> {uid: bytes}."""
+    typ, data = M.uid("FETCH", ",".join(map(str, uids)), f"(BODY.PEEK[{part}])")
+    if typ != "OK":
+        raise RuntimeError(f"IMAP: fetch part {part} failed")
+    out = {}
+    for item in data:
+        if isinstance(item, tuple):
+            m = re.search(rb"UID (\d+)", item[0])
+            if m:
+                out[int(m.group(1))] = item[1]
+    return out
+
+
+# --------- архів / чекпойнт ---------
+class Checkpoint:
+    def __init__(self, archive_dir: str, uidvalidity: int):
+        self.path = os.path.join(archive_dir, CHECKPOINT_NAME)
+        self.uidvalidity = uidvalidity
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            # UIDVALIDITY змінився — старі UID більше нічого не означають
+            if state.get("uidvalidity") == uidvalidity:
+                for a, b in state.get("done", []):
+                    self.done.update(range(a, b + 1))
+
+    def _ranges(self):
+        out = []
+        for u in sorted(self.done):
+            if out and u == out[-1][1] + 1:
+                out[-1][1] = u
+            else:
+                out.append([u, u])
+        return out
+
+    def mark(self, uids):
+        with self._lock:
+            self.done.update(uids)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"uidvalidity": self.uidvalidity, "done": self._ranges()}, f)
+            os.replace(tmp, self.path)
+
+
+def parse_snapshot(data: bytes) -> pd.DataFrame:
+    """Виконується в пулі процесів."""
+    return stock_cache.normalized(oe.read_stock_excel(data))
+
+
+def write_snapshot(df: pd.DataFrame, archive_dir: str, date: dt.date, uid: int, fname: str) -> str:
+    df = df.assign(snapshot_date=pd.Timestamp(date), uid=uid, filename=fname)
+    path = os.path.join(archive_dir, f"{date:%Y-%m-%d}_{uid}{SNAPSHOT_EXT}")
+    tmp = path + ".tmp"
+    if SNAPSHOT_EXT == ".parquet":
+        df.to_parquet(tmp, index=False, compression="zstd")
+    else:
+        df.to_pickle(tmp, compression="gzip")
+    os.replace(tmp, path)
+    return path
+
+
+def load_history(archive_dir: str = None) -> pd.DataFrame:
+    """Усі знімки архіву в одному DataFrame (snapshot_date, uid, filename + колонки залишків)."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    frames = []
+    for p in sorted(glob.glob(os.path.join(archive_dir, "*_*.parquet")) + glob.glob(os.path.join(archive_dir, "*_*.pkl.gz"))):
+        frames.append(pd.read_parquet(p) if p.endswith(".parquet") else pd.read_pickle(p, compression="gzip"))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# --------- бекфіл ---------
+def backfill(since=None, before=None, workers: int = 4, procs: int = None, archive_dir: str = None) -> dict:
+    archive_dir = archive_dir or ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    regex = re.compile(IMAP_FILENAME_REGEX, re.I)
+
+    M = connect()
+    try:
+        uidvalidity, uids = list_uids(M, since, before)
+    finally:
+        M.logout()
+    ckpt = Checkpoint(archive_dir, uidvalidity)
+    todo = [u for u in uids if u not in ckpt.done]
+    print(f"[BACKFILL] UID всього: {len(uids)}, уже в архіві: {len(uids) - len(todo)}, до обробки: {len(todo)}")
+
+    stats = {"messages": 0, "attachments": 0, "duplicates": 0, "snapshots": 0, "errors": 0}
+    stats_lock = threading.Lock()
+    seen = {}                                   # content_key -> Future парсингу першого входження
+    in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+    def bump(key, n=1):
+        with stats_lock:
+            stats[key] += n
+
+    def on_parsed(fut, uid, date, fname, release=True):
+        try:
+            write_snapshot(fut.result(), archive_dir, date, uid, fname)
+            bump("snapshots")
+            ckpt.mark([uid])
+        except Exception as e:
+            bump("errors")
+            print(f"[BACKFILL ERROR] uid={uid} {fname}: {e}")
+        finally:
+            if release:
+                in_flight.release()
+
+    def worker(slice_uids):
+        conn = connect()
+        try:
+            for i in range(0, len(slice_uids), FETCH_BATCH):
+                batch = slice_uids[i:i + FETCH_BATCH]
+                typ, data = conn.uid("FETCH", ",".join(map(str, batch)), "(UID INTERNALDATE BODYSTRUCTURE)")
+                if typ != "OK":
+                    raise RuntimeError("IMAP: fetch BODYSTRUCTURE failed")
+                meta = parse_fetch(data)
+                bump("messages", len(batch))
+
+                by_part, no_match = {}, []
+                for uid in batch:
+                    attrs = meta.get(uid)
+                    parts = matching_parts(attrs.get("BODYSTRUCTURE"), regex) if attrs else []
+                    if not parts:
+                        no_match.append(uid)
+                    for part, fname, enc in parts[:1]:   # одне вкладення export_limits на лист
+                        by_part.setdefault(part, []).append((uid, fname, enc))
+                if no_match:
+                    ckpt.mark(no_match)
+
+                for part, items in by_part.items():
+                    payloads = fetch_parts(conn, [u for u, _, _ in items], part)
+                    for uid, fname, enc in items:
+                        data = _decode_payload(payloads.get(uid, b""), enc)
+                        bump("attachments")
+                        key = stock_cache.content_key(data)
+                        date = _parse_internaldate(meta[uid].get("INTERNALDATE"))
+                        in_flight.acquire()
+                        with stats_lock:
+                            fut = seen.get(key)
+                            dup = fut is not None
+                            if not dup:
+                                fut = seen[key] = pool.submit(parse_snapshot, data)
+                        if dup:
+                            # Той самий вміст: парсинг не повторюємо, знімок на цю дату — пишемо
+                            in_flight.release()
+                            bump("duplicates")
+                        fut.add_done_callback(lambda f, u=uid, d=date, n=fname, r=not dup: on_parsed(f, u, d, n, r))
+        finally:
+            try: conn.logout()
+            except Exception: pass
+
+    workers = max(1, min(workers, len(todo) or 1))
+    step = -(-len(todo) // workers) if todo else 0
+    slices = [todo[i:i + step] for i in range(0, len(todo), step)] if step else []
+    # spawn: воркери пулу стартують ліниво з потоків, що тримають IMAP/SSL-сокети, — fork тут небезпечний
+    with ProcessPoolExecutor(procs, mp_context=multiprocessing.get_context("spawn")) as pool:
+        with ThreadPoolExecutor(workers) as tp:
+            for f in [tp.submit(worker, s) for s in slices]:
+                f.result()
+    print(f"[BACKFILL] {stats}")
+    return stats
+
+
+def _date(s):
+    return dt.date.fromisoformat(s) if s else None
+
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="Бекфіл історії export_limits з IMAP в архів знімків")
+    p.add_argument("--since", help="YYYY-MM-DD")
+    p.add_argument("--before", help="YYYY-MM-DD")
+    p.add_argument("--workers", type=int, default=4, help="Паралельних IMAP-з'єднань")
+    p.add_argument("--procs", type=int, default=None, help="Процесів для парсингу (за замовчуванням — к-сть CPU)")
+    p.add_argument("--archive", default=ARCHIVE_DIR)
+    args = p.parse_args()
+    backfill(_date(args.since), _date(args.before), args.workers, args.procs, args.archive)
@@ -4,21 +4,32 @@ AI Beer Stock Manager — дві точки (Боголюбова / Європе
 Експорт у .xlsx з «людськими» колонками + список товарів без постачальника.
 
 Функції:
-- Читає Excel із залишками (терпить шапку; знаходить рядок заголовків)
+- Читає залишки з .xlsx / .xls / .ods / CSV / TSV — формат визначається за
+  magic bytes (і для шляхів, і для байтів із пошти); терпить шапку
 - Парсить кількості та одиниці (шт/л/кг)
 - Ділить Ліміт навпіл для кожного магазину (ceil)
-- Рахує потребу окремо по магазинах, округляє до pack_size з suppliers
+- Спершу перерозподіляє надлишки між магазинами (переміщення), далі
+  рахує потребу окремо по магазинах, округляє до pack_size з suppliers
 - Формує 2 XLSX зі зрозумілими колонками (аналог стилю файлу з пошти)
 - Формує третій XLSX: MISSING_SUPPLIERS.xlsx — продукти без постачальника
+- Формує TRANSFERS.xlsx — переміщення між магазинами
+- Якщо в suppliers є ціни / мінімальні суми / тари / дні доставки —
+  оптимізує замовлення (supplier_optimizer), відкладене — у DEFERRED.xlsx
 - Надсилає все в Telegram (якщо DRY_RUN=0)
+- run_engine(stock, suppliers, EngineConfig(...)) — реентерабельний запуск
+  без глобального стану; кожен запуск пише у власну підпапку OUT_DIR/<run_id>
 
 ENV:
 - DRY_RUN=1|0
 - OUT_DIR=out
+- REBALANCE=1|0 (переміщення між магазинами перед замовленням)
 - TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+- TELEGRAM_API_BASE=https://api.telegram.org (напр. локальний фейковий Bot API)
 """
 
-import os, io, re, math, unicodedata, pandas as pd, requests
+import os, io, re, csv, math, time, codecs, uuid, unicodedata, numpy as np, pandas as pd, requests
+from dataclasses import dataclass, field
+import supplier_optimizer as so
 
 # --------- env loader ---------
 try:
@@ -34,6 +45,8 @@ os.makedirs(OUT_DIR, exist_ok=True)
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "555406850").strip()
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+REBALANCE = int(os.getenv("REBALANCE", "1"))
 
 # Базові назви колонок
 COL_PRODUCT_STD = "Інгредієнти"
@@ -45,6 +58,9 @@ COL_LIMIT_STD   = "Ліміт"
 STORE_A_NAME = "Боголюбова"
 STORE_B_NAME = "Європейська, 31а"
 
+# (назва магазину, колонка залишку) — порядок визначає колонки _in_* у rebalance_stock
+STORES = [(STORE_A_NAME, "_qty_a"), (STORE_B_NAME, "_qty_b")]
+
 
 def _clean_text(s: str) -> str:
     if pd.isna(s): return ""
@@ -67,29 +83,121 @@ def parse_qty_and_unit(val):
     return qty, unit
 
 
+# --------- визначення формату за magic bytes ---------
+MAGIC_OLE2 = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"   # .xls (BIFF у контейнері OLE2)
+MAGIC_ZIP = b"PK\x03\x04"                            # .xlsx / .ods
+ODS_MIMETYPE = b"application/vnd.oasis.opendocument.spreadsheet"
+
+
+def _head_bytes(path_or_bytes, n=65536) -> bytes:
+    if isinstance(path_or_bytes, (str, os.PathLike)):
+        with open(path_or_bytes, "rb") as f:
+            return f.read(n)
+    return bytes(path_or_bytes[:n])
+
+
+def detect_format(path_or_bytes) -> str:
+    """'xls' | 'xlsx' | 'ods' | 'csv' — за вмістом, а не за розширенням."""
+    head = _head_bytes(path_or_bytes)
+    if head.startswith(MAGIC_OLE2):
+        return "xls"
+    if head.startswith(MAGIC_ZIP):
+        # У ODS першим записом архіву лежить нестиснений «mimetype»
+        if ODS_MIMETYPE in head[:200]:
+            return "ods"
+        return "xlsx"
+    return "csv"
+
+
+def _sniff_text(head: bytes):
+    """Кодування та роздільник для CSV/TSV з POS (за першими рядками — шапка звіту може бути без роздільників)."""
+    if head.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    else:
+        try:
+            head.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            encoding = "utf-8" if e.start >= len(head) - 3 else "cp1251"
+    lines = head.decode(encoding, errors="replace").splitlines()[:50]
+    if len(head) >= 65536 and len(lines) > 1:
+        lines = lines[:-1]  # останній рядок проби може бути обрізаним
+    return encoding, _sniff_delimiter(lines)
+
+
+def _sniff_delimiter(lines) -> str:
+    """
+    Роздільник, з яким найбільше рядків мають однакову (найчастішу) кількість полів.
+    Не «найбільше входжень»: у ;-експорті з десятковими комами («0,5;Пиво;10,5 л»)
+    ком може бути більше, але їх кількість скаче від рядка до рядка.
+    Рядки з одним полем (шапка звіту) не враховуються.
+    """
+    best, best_score = ",", (0, 0)
+    for d in [",", ";", "\t", "|"]:
+        counts = [len(r) for r in csv.reader(lines, delimiter=d) if len(r) > 1]
+        if not counts:
+            continue
+        mode = max(set(counts), key=lambda c: (counts.count(c), c))
+        score = (counts.count(mode), mode)
+        if score > best_score:
+            best, best_score = d, score
+    return best
+
+
 def read_excel_any(path_or_bytes, header=None):
-    try:
-        if isinstance(path_or_bytes, (str, os.PathLike)):
-            return pd.read_excel(path_or_bytes, engine="openpyxl", header=header)
+    fmt = detect_format(path_or_bytes)
+    src = path_or_bytes if isinstance(path_or_bytes, (str, os.PathLike)) else io.BytesIO(path_or_bytes)
+    if fmt == "csv":
+        head = _head_bytes(path_or_bytes)
+        encoding, sep = _sniff_text(head)
+        names = None
+        if header is None:
+            # Шапка звіту може бути «коротшою» за таблицю — фіксуємо ширину заздалегідь
+            lines = head.decode(encoding, errors="replace").splitlines()[:200]
+            width = max((len(r) for r in csv.reader(lines, delimiter=sep)), default=1)
+            names = list(range(width))
+        try:
+            return pd.read_csv(src, header=header, names=names, sep=sep, encoding=encoding)
+        except UnicodeDecodeError:
+            # Проба була ASCII/UTF-8, а cp1251 трапився далі — перечитуємо (як у stock_manager)
+            src = path_or_bytes if isinstance(path_or_bytes, (str, os.PathLike)) else io.BytesIO(path_or_bytes)
+            return pd.read_csv(src, header=header, names=names, sep=sep, encoding="cp1251")
+    if fmt == "xls":
+        try:
+            import xlrd  # noqa
+        except ImportError as e:
+            raise RuntimeError("Не вдалося прочитати .xls. Збережіть як .xlsx або встановіть xlrd==2.0.1") from e
+        return pd.read_excel(src, engine="xlrd", header=header)
+    if fmt == "ods":
+        try:
+            import odf  # noqa
+        except ImportError as e:
+            raise RuntimeError("Не вдалося прочитати .ods. Збережіть як .xlsx або встановіть odfpy") from e
+        return pd.read_excel(src, engine="odf", header=header)
+    return pd.read_excel(src, engine="openpyxl", header=header)
+
+
+def _header_names(values) -> list:
+    # Як у pandas: порожні — «Unnamed: i», дублікати — «назва.1», «назва.2»…
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        name = _clean_text(v) or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
         else:
-            return pd.read_excel(io.BytesIO(path_or_bytes), engine="openpyxl", header=header)
-    except Exception:
-        # друга спроба для .xls (якщо встановлено xlrd)
-        if isinstance(path_or_bytes, (str, os.PathLike)) and str(path_or_bytes).lower().endswith(".xls"):
-            try:
-                import xlrd  # noqa
-                if isinstance(path_or_bytes, (str, os.PathLike)):
-                    return pd.read_excel(path_or_bytes, engine="xlrd", header=header)
-                else:
-                    return pd.read_excel(io.BytesIO(path_or_bytes), engine="xlrd", header=header)
-            except Exception as e2:
-                raise RuntimeError("Не вдалося прочитати .xls. Збережіть як .xlsx або встановіть xlrd==2.0.1") from e2
-        raise
+            seen[name] = 0
+        names.append(name)
+    return names
 
 
 def read_stock_excel(path_or_bytes):
-    # 1) Проба без заголовків — шукаємо рядок із заголовками
-    df_probe = read_excel_any(path_or_bytes, header=None)
+    # 1) Читаємо один раз без заголовків — шукаємо рядок із заголовками
+    #    (DataFrame — уже «сира» сітка, напр. з Google Sheets)
+    if isinstance(path_or_bytes, pd.DataFrame):
+        df_probe = path_or_bytes
+    else:
+        df_probe = read_excel_any(path_or_bytes, header=None)
     key_tokens = ["нгредієн", "атегор", "боголюб", "європейсь", "лім", "європейська", "31а"]
     header_idx = None
     for i in range(min(10, len(df_probe))):
@@ -99,11 +207,13 @@ def read_stock_excel(path_or_bytes):
             header_idx = i
             break
     if header_idx is None:
-        header_idx = 0
+        raise ValueError("Не знайдено рядок заголовків (Інгредієнти / Категорія / Боголюбова / Європейська / Ліміт) "
+                         "у перших 10 рядках файлу залишків")
 
-    # 2) Читаємо з тим заголовком
-    df = read_excel_any(path_or_bytes, header=header_idx)
-    df.columns = [_clean_text(c) for c in df.columns]
+    # 2) Заголовок — з того ж фрейму, без повторного парсингу файлу
+    df = df_probe.iloc[header_idx + 1:].reset_index(drop=True)
+    df.columns = _header_names(df_probe.iloc[header_idx].tolist()) if len(df_probe) else []
+    df = df.dropna(how="all")
 
     # 3) Знаходимо потрібні колонки (терпимо варіанти)
     def pick(colnames, needles):
@@ -150,6 +260,13 @@ def load_suppliers(df_sup):
     pname = next((cols[k] for k in cols if k in ["product_name", "товар", "інгредієнти", "назва товару", "інгредієнт", "назва"]), None)
     sname = next((cols[k] for k in cols if k in ["supplier_name", "постачальник", "постач", "vendor", "постачальники"]), None)
     psize = next((cols[k] for k in cols if k in ["pack_size", "кратність", "упаковка", "кратнiсть", "кратність упаковки"]), None)
+    # Опційні обмеження постачальника (див. supplier_optimizer)
+    extra = {
+        "price": ["price", "ціна", "ціна за од.", "ціна за одиницю"],
+        "min_order": ["min_order", "min_order_value", "мінімальне замовлення", "мін. замовлення", "мінімалка"],
+        "pack_tiers": ["pack_tiers", "тари", "варіанти тари", "пакування"],
+        "delivery_days": ["delivery_days", "дні доставки", "доставка"],
+    }
     if not pname or not sname:
         raise ValueError("У довіднику немає обов'язкових колонок product_name/товар та supplier_name/постачальник")
     df = df_sup.copy()
@@ -161,12 +278,77 @@ def load_suppliers(df_sup):
     df["product_name"] = df["product_name"].astype(str).str.strip()
     df["supplier_name"] = df["supplier_name"].astype(str).str.strip()
     df["pack_size"] = pd.to_numeric(df["pack_size"], errors="coerce").fillna(1).astype(int)
-    return df[["product_name", "supplier_name", "pack_size"]]
-
-
-def compute_orders_and_missing(df_stock, df_sup):
+    for std, aliases in extra.items():
+        src = next((cols[k] for k in cols if k in aliases), None)
+        df[std] = df_sup[src].values if src else None
+    df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0.0)
+    df["min_order"] = pd.to_numeric(df["min_order"], errors="coerce").fillna(0.0)
+    df["pack_tiers"] = df["pack_tiers"].fillna("").astype(str).str.strip()
+    df["delivery_days"] = df["delivery_days"].fillna("").astype(str).str.strip()
+    return df[["product_name", "supplier_name", "pack_size", "price", "min_order", "pack_tiers", "delivery_days"]]
+
+
+def rebalance_stock(df_stock, stores=None):
+    """
+    Переміщення надлишків між магазинами до замовлення у постачальника.
+
+    Один векторизований прохід по матриці (товар × магазин):
+    надлишок = max(залишок - ліміт, 0), дефіцит = max(ліміт - залишок, 0).
+    Надлишки й дефіцити кожного товару розкладаються на відрізки числової
+    осі (cumsum), переміщення — це перетини відрізків донор × одержувач.
+    Обсяг переміщення по товару = min(сумарний надлишок, сумарний дефіцит),
+    тож у постачальника замовляється лише залишок потреби.
+
+    Повертає (копія df_stock з колонками _in_<qty_col> — чисте надходження,
+    DataFrame переміщень).
+    """
+    stores = stores or STORES
+    qty_cols = [c for _, c in stores]
+    names = np.array([n for n, _ in stores], dtype=object)
+
+    qty = df_stock[qty_cols].to_numpy(dtype=float).clip(min=0)          # (P, K)
+    limit = df_stock["_limit_per_store"].to_numpy(dtype=float)[:, None]  # (P, 1)
+    surplus = (qty - limit).clip(min=0)
+    deficit = (limit - qty).clip(min=0)
+
+    movable = np.minimum(surplus.sum(axis=1), deficit.sum(axis=1))[:, None]
+    s_end = np.cumsum(surplus, axis=1)
+    s_start = s_end - surplus
+    d_cum = np.cumsum(deficit, axis=1)
+    d_end = np.minimum(d_cum, movable)
+    d_start = np.minimum(d_cum - deficit, movable)
+
+    # (P, K_from, K_to)
+    flow = (np.minimum(s_end[:, :, None], d_end[:, None, :])
+            - np.maximum(s_start[:, :, None], d_start[:, None, :])).clip(min=0)
+
+    out = df_stock.copy()
+    net_in = flow.sum(axis=1) - flow.sum(axis=2)
+    for k, c in enumerate(qty_cols):
+        out[f"_in{c}"] = net_in[:, k]
+
+    p_idx, k_from, k_to = np.nonzero(flow > 1e-9)
+    transfers = pd.DataFrame({
+        "Інгредієнти": df_stock["product_name"].to_numpy()[p_idx],
+        "Категорія": df_stock["category"].to_numpy()[p_idx],
+        "Одиниця": df_stock["_unit"].to_numpy()[p_idx],
+        "Звідки": names[k_from],
+        "Куди": names[k_to],
+        "Перемістити": flow[p_idx, k_from, k_to],
+    }).sort_values(["Звідки", "Куди", "Інгредієнти"]).reset_index(drop=True)
+    return out, transfers
+
+
+def compute_orders_and_missing(df_stock, df_sup, with_deferred=False):
+    """
+    Повертає (po_a, po_b, missing); з with_deferred=True — ще й DataFrame
+    замовлень, відкладених через мінімальну суму постачальника.
+    """
+    optimize = so.has_constraints(df_sup) if {"price", "min_order"} <= set(df_sup.columns) else False
     merged = df_stock.merge(df_sup, how="left", on="product_name")
     merged["pack_size"] = merged["pack_size"].fillna(1).astype(int)
+    for c, default in [("price", 0.0), ("min_order", 0.0), ("pack_tiers", ""), ("delivery_days", "")]:
+        merged[c] = merged[c].fillna(default) if c in merged.columns else default
     merged["supplier_name"] = merged["supplier_name"].fillna("Невідомий постачальник")
 
     # Список відсутніх постачальників
@@ -181,60 +363,121 @@ def compute_orders_and_missing(df_stock, df_sup):
     def make_po(store_col_qty, store_name):
         m = merged.copy()
         m["stock_qty"] = m[store_col_qty]
-        m["need"] = (m["_limit_per_store"] - m["stock_qty"]).clip(lower=0)
-
-        def round_pack(row):
-            if row["need"] <= 0:
-                return 0
-            return int(math.ceil(row["need"] / row["pack_size"]) * row["pack_size"])
-
-        m["order_qty"] = m.apply(round_pack, axis=1)
+        # Чисте надходження з інших магазинів (якщо був rebalance_stock)
+        has_inbound = f"_in{store_col_qty}" in m.columns
+        m["inbound"] = m[f"_in{store_col_qty}"] if has_inbound else 0.0
+        m["need"] = (m["_limit_per_store"] - m["stock_qty"] - m["inbound"]).clip(lower=0)
+
+        # «Переміщення»: + отримає з іншого магазину, − віддасть (лише якщо був rebalance)
+        cols = ["product_name", "category", "unit", "_limit_per_store", "stock_qty"] + (["inbound"] if has_inbound else []) \
+            + ["order_qty", "pack_size", "supplier_name"]
+        if optimize:
+            m = so.optimize_orders(m)
+            m["order_qty"] = m["order_qty"].astype(int)
+            cols += ["pack_plan", "price", "order_value", "delivery_date", "decision", "reason"]
+        else:
+            pack = m["pack_size"].clip(lower=1)
+            m["order_qty"] = (np.ceil(m["need"].round(9) / pack) * pack).astype(int)
+            m["decision"] = so.DECISION_ORDER
         m = m[m["order_qty"] > 0].copy()
         m["unit"] = m["_unit"]
 
         # Формат під «людську» таблицю (аналог експорту)
-        out = m[["product_name", "category", "unit", "_limit_per_store", "stock_qty", "order_qty", "pack_size", "supplier_name"]].rename(columns={
+        out = m[cols].rename(columns={
             "product_name": "Інгредієнти",
             "category": "Категорія",
             "unit": "Одиниця",
             "_limit_per_store": "Ліміт на магазин",
             "stock_qty": "Залишок",
+            "inbound": "Переміщення",
             "order_qty": "Замовити",
             "pack_size": "Кратність",
-            "supplier_name": "Постачальник"
+            "supplier_name": "Постачальник",
+            "pack_plan": "Тара",
+            "price": "Ціна",
+            "order_value": "Сума",
+            "delivery_date": "Доставка",
+            "decision": "Рішення",
+            "reason": "Примітка",
         }).sort_values(["Постачальник", "Інгредієнти"])
-        return out
-
-    po_a = make_po("_qty_a", STORE_A_NAME)
-    po_b = make_po("_qty_b", STORE_B_NAME)
+        is_deferred = m["decision"].eq(so.DECISION_DEFERRED).to_numpy()
+        deferred = out[is_deferred].assign(**{"Магазин": store_name})
+        return out[~is_deferred], deferred
+
+    po_a, def_a = make_po("_qty_a", STORE_A_NAME)
+    po_b, def_b = make_po("_qty_b", STORE_B_NAME)
+    if with_deferred:
+        return po_a, po_b, missing, pd.concat([def_a, def_b], ignore_index=True)
     return po_a, po_b, missing
 
 
+# --------- Конфігурація запуску ---------
+@dataclass(frozen=True)
+class EngineConfig:
+    """
+    Явна конфігурація одного запуску. Замість присвоєння глобалів модуля
+    (oe.OUT_DIR = ...) кожен запуск/сесія передає власний EngineConfig —
+    паралельні запуски в потоках чи процесах не заважають один одному.
+    """
+    out_dir: str = "out"
+    dry_run: int = 1
+    telegram_bot_token: str = ""
+    telegram_chat_id: str = ""
+    rebalance: int = 1
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Значення з глобалів модуля (ENV), з можливістю перевизначення."""
+        base = dict(out_dir=OUT_DIR, dry_run=DRY_RUN, telegram_bot_token=TELEGRAM_BOT_TOKEN,
+                    telegram_chat_id=TELEGRAM_CHAT_ID, rebalance=REBALANCE)
+        base.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**base)
+
+
+@dataclass
+class EngineResult:
+    po_a: pd.DataFrame
+    po_b: pd.DataFrame
+    missing: pd.DataFrame
+    transfers: pd.DataFrame
+    deferred: pd.DataFrame
+    out_dir: str
+    files: dict = field(default_factory=dict)   # ключ (po_a/po_b/missing/transfers/deferred) -> шлях
+    summary: str = ""
+
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
 # --------- Telegram helpers ---------
-def tg_api(method):
-    if not TELEGRAM_BOT_TOKEN:
+def tg_api(method, cfg: EngineConfig = None):
+    token = cfg.telegram_bot_token if cfg else TELEGRAM_BOT_TOKEN
+    if not token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN не задано")
-    return f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/{method}"
+    return f"{TELEGRAM_API_BASE}/bot{token}/{method}"
 
-def tg_send_message(text):
-    if DRY_RUN:
+def tg_send_message(text, cfg: EngineConfig = None):
+    cfg = cfg or EngineConfig.from_env()
+    if cfg.dry_run:
         print("[DRY_RUN][TG] sendMessage:", text[:1200])
         return
-    r = requests.post(tg_api("sendMessage"), data={
-        "chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML", "disable_web_page_preview": True
+    r = requests.post(tg_api("sendMessage", cfg), data={
+        "chat_id": cfg.telegram_chat_id, "text": text, "parse_mode": "HTML", "disable_web_page_preview": True
     }, timeout=30)
     r.raise_for_status()
 
-def tg_send_document(path, caption=None):
-    if DRY_RUN:
+def tg_send_document(path, caption=None, cfg: EngineConfig = None):
+    cfg = cfg or EngineConfig.from_env()
+    if cfg.dry_run:
         print(f"[DRY_RUN][TG] sendDocument: {path} (caption={caption})")
         return
     with open(path, "rb") as f:
         files = {"document": (os.path.basename(path), f)}
-        data = {"chat_id": TELEGRAM_CHAT_ID}
+        data = {"chat_id": cfg.telegram_chat_id}
         if caption:
             data["caption"] = caption[:1024]; data["parse_mode"] = "HTML"
-        r = requests.post(tg_api("sendDocument"), data=data, files=files, timeout=60)
+        r = requests.post(tg_api("sendDocument", cfg), data=data, files=files, timeout=60)
         r.raise_for_status()
 
 
@@ -260,60 +503,113 @@ def ai_line(df_po: pd.DataFrame, store_name: str) -> str:
     return f"Магазин {store_name}: {len(df_po)} позицій. Підсумок: {', '.join(parts) if parts else '0'}. Топ: {top if top else '—'}."
 
 
-def process_and_send(stock_path, suppliers_path):
+OUTPUT_FILES = {
+    "po_a": "PO_Боголюбова.xlsx",
+    "po_b": "PO_Європейська_31а.xlsx",
+    "missing": "MISSING_SUPPLIERS.xlsx",
+    "transfers": "TRANSFERS.xlsx",
+    "deferred": "DEFERRED.xlsx",
+}
+
+
+def read_suppliers_any(suppliers):
+    """Шлях до .csv/.xls(x) або вже готовий DataFrame -> нормалізований довідник."""
+    if isinstance(suppliers, pd.DataFrame):
+        return load_suppliers(suppliers)
+    return load_suppliers(read_excel_any(suppliers, header=0))
+
+
+def run_engine(stock=None, suppliers=None, cfg: EngineConfig = None, run_id: str = None, send: bool = True,
+               source=None) -> EngineResult:
+    """
+    Реентерабельний запуск: без глобального стану, усе — через cfg.
+    Файли пишуться у cfg.out_dir/<run_id> (run_id="" — прямо в cfg.out_dir).
+    stock — шлях / байти Excel, «сира» сітка або вже розпарсений
+    read_stock_excel DataFrame; suppliers — шлях або DataFrame.
+    source — app.datasource.DataSource (напр. Google Sheets): звідти беруться
+    stock/suppliers, якщо їх не передано, і туди ж записуються результати.
+    """
+    if source is not None:
+        stock = source.read_stock_grid() if stock is None else stock
+        suppliers = source.read_suppliers() if suppliers is None else suppliers
+    cfg = cfg or EngineConfig.from_env()
+    run_id = new_run_id() if run_id is None else run_id
+    out_dir = os.path.join(cfg.out_dir, run_id) if run_id else cfg.out_dir
+    os.makedirs(out_dir, exist_ok=True)
+
     # 1) Вхідні дані
-    df_stock = read_stock_excel(stock_path)
-    if suppliers_path.lower().endswith((".xls", ".xlsx")):
-        df_sup_raw = read_excel_any(suppliers_path, header=0)
-    else:
-        df_sup_raw = pd.read_csv(suppliers_path)
-    df_sup = load_suppliers(df_sup_raw)
+    parsed = isinstance(stock, pd.DataFrame) and "_qty_a" in stock.columns
+    df_stock = stock if parsed else read_stock_excel(stock)
+    df_sup = read_suppliers_any(suppliers)
 
-    # 2) Розрахунок
-    po_a, po_b, missing = compute_orders_and_missing(df_stock, df_sup)
+    # 2) Розрахунок: спершу переміщення між магазинами, далі замовлення
+    transfers = pd.DataFrame()
+    if cfg.rebalance:
+        df_stock, transfers = rebalance_stock(df_stock)
+    po_a, po_b, missing, deferred = compute_orders_and_missing(df_stock, df_sup, with_deferred=True)
 
     # 3) Збереження XLSX
-    saved_files = []
-    if not po_a.empty:
-        path_a = os.path.join(OUT_DIR, "PO_Боголюбова.xlsx")
-        save_xlsx(po_a, path_a)
-        saved_files.append(path_a)
-    if not po_b.empty:
-        path_b = os.path.join(OUT_DIR, "PO_Європейська_31а.xlsx")
-        save_xlsx(po_b, path_b)
-        saved_files.append(path_b)
-    # Missing suppliers
-    if not missing.empty:
-        path_m = os.path.join(OUT_DIR, "MISSING_SUPPLIERS.xlsx")
-        save_xlsx(missing, path_m)
-        saved_files.append(path_m)
-
-    print("[LOCAL SAVE]", " | ".join(saved_files) if saved_files else "—")
+    frames = {"po_a": po_a, "po_b": po_b, "missing": missing, "transfers": transfers, "deferred": deferred}
+    files = {}
+    for key, df in frames.items():
+        if not df.empty:
+            files[key] = os.path.join(out_dir, OUTPUT_FILES[key])
+            save_xlsx(df, files[key])
+
+    print("[LOCAL SAVE]", " | ".join(files.values()) if files else "—")
 
     # 4) Повідомлення
     comment_a = ai_line(po_a, STORE_A_NAME)
     comment_b = ai_line(po_b, STORE_B_NAME)
     body = f"{comment_a}\n{comment_b}"
+    if not transfers.empty:
+        body += f"\nПереміщення між магазинами: {len(transfers)} позицій."
+    if not deferred.empty:
+        body += f"\nВідкладено (нижче мінімуму постачальника): {deferred['Постачальник'].nunique()} постачальників, {len(deferred)} позицій."
     print("[SUMMARY]\n", body)
 
-    # 5) Відправка в Telegram (xlsx)
+    result = EngineResult(po_a, po_b, missing, transfers, deferred, out_dir, files, body)
+    if source is not None:
+        # Назви аркушів — як у файлів, без розширення
+        source.write_tables({os.path.splitext(OUTPUT_FILES[k])[0]: df for k, df in frames.items()})
+    if send:
+        send_result(result, cfg)
+    return result
+
+
+def send_result(result: EngineResult, cfg: EngineConfig):
+    # Відправка в Telegram (xlsx)
     try:
-        tg_send_message(f"<b>AI Beer Stock Manager</b>\n{body}")
-        for p in saved_files:
-            cap = f"<code>{os.path.basename(p)}</code>"
-            tg_send_document(p, caption=cap)
+        tg_send_message(f"<b>AI Beer Stock Manager</b>\n{result.summary}", cfg=cfg)
+        for p in result.files.values():
+            tg_send_document(p, caption=f"<code>{os.path.basename(p)}</code>", cfg=cfg)
     except Exception as e:
         print("[TG ERROR]", e)
-        if DRY_RUN:
+        if cfg.dry_run:
             print("DRY_RUN активний або відсутній токен — це очікувано під час тесту.")
 
-    return po_a, po_b, missing
+
+def process_and_send(stock_path, suppliers_path, with_transfers: bool = False):
+    # Сумісність: конфігурація з глобалів модуля, файли прямо в OUT_DIR;
+    # переміщення — лише на запит, щоб не ламати розпаковку (po_a, po_b, missing)
+    r = run_engine(stock_path, suppliers_path, EngineConfig.from_env(), run_id="")
+    if with_transfers:
+        return r.po_a, r.po_b, r.missing, r.transfers
+    return r.po_a, r.po_b, r.missing
 
 
 if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser(description="AI Beer Stock Manager → XLSX + Telegram")
-    p.add_argument("--stock", required=True, help="Шлях до Excel із залишками (.xlsx/.xls)")
-    p.add_argument("--suppliers", default="suppliers.csv", help="Шлях до suppliers.csv або .xlsx")
+    p.add_argument("--source", choices=["csv", "sheets"], default=os.getenv("DATA_SOURCE", "csv"),
+                   help="sheets — залишки й постачальники з Google Sheets, результати — туди ж")
+    p.add_argument("--stock", help="Шлях до файлу із залишками (.xlsx/.xls/.ods/.csv/.tsv)")
+    p.add_argument("--suppliers", default=None, help="Шлях до suppliers.csv або .xlsx")
     args = p.parse_args()
-    process_and_send(args.stock, args.suppliers)
+    if args.source == "sheets":
+        from app.datasource import make_source
+        run_engine(args.stock, args.suppliers, EngineConfig.from_env(), run_id="", source=make_source("sheets"))
+    elif not args.stock:
+        p.error("--stock обов'язковий для --source csv")
+    else:
+        process_and_send(args.stock, args.suppliers or "suppliers.csv")
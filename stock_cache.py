@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Кеш розпарсених залишків (content-addressed).
+
+Ключ — SHA-256 байтів вкладення (+ версія формату кешу), тож той самий
+експорт, що прийшов повторно, не парситься openpyxl вдруге: нормалізований
+фрейм читається з диска у колонковому форматі (parquet, якщо є pyarrow;
+інакше pickle) і одразу йде в розрахунок.
+
+- Обмеження розміру кешу на диску, витіснення LRU (за mtime, оновлюється при hit)
+- Лічильники hit/miss/evicted для логу запуску
+
+ENV:
+- STOCK_CACHE_DIR=.cache/stock
+- STOCK_CACHE_MAX_MB=64
+"""
+
+import os, hashlib, threading, pandas as pd
+
+CACHE_DIR = os.getenv("STOCK_CACHE_DIR", os.path.join(".cache", "stock"))
+CACHE_MAX_BYTES = int(float(os.getenv("STOCK_CACHE_MAX_MB", "64")) * 1024 * 1024)
+# Збільшити, якщо змінюється логіка read_stock_excel — старі записи перестануть збігатися
+CACHE_VERSION = "2"
+
+# Нормалізовані колонки, яких достатньо для compute_orders_and_missing
+STOCK_COLUMNS = [
+    "product_name", "category",
+    "_qty_a", "_unit_a", "_qty_b", "_unit_b",
+    "_limit_qty", "_limit_unit", "_limit_per_store", "_unit",
+]
+
+try:
+    import pyarrow  # noqa
+    CACHE_EXT = ".parquet"
+except Exception:
+    CACHE_EXT = ".pkl"
+
+STATS = {"hit": 0, "miss": 0, "evicted": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(name: str):
+    with _STATS_LOCK:
+        STATS[name] += 1
+
+
+def content_key(data: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(CACHE_VERSION.encode("ascii") + b"\0")
+    h.update(data)
+    return h.hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key + CACHE_EXT)
+
+
+def _read(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def _write(df: pd.DataFrame, path: str):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, path)  # атомарно: паралельний читач не побачить напівзаписаний файл
+
+
+def cache_get(key: str):
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        _count("miss")
+        return None
+    try:
+        df = _read(path)
+    except Exception:
+        # Пошкоджений запис — прибираємо і вважаємо промахом
+        try: os.remove(path)
+        except OSError: pass
+        _count("miss")
+        return None
+    try: os.utime(path, None)  # LRU: свіжий доступ
+    except OSError: pass
+    _count("hit")
+    return df
+
+
+def normalized(df: pd.DataFrame) -> pd.DataFrame:
+    cols = [c for c in STOCK_COLUMNS if c in df.columns]
+    return df[cols].reset_index(drop=True)
+
+
+def cache_put(key: str, df: pd.DataFrame):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    _write(normalized(df), _entry_path(key))
+    evict(keep=key)
+
+
+def evict(max_bytes: int = None, keep: str = None):
+    """Видаляє найдавніше використані записи, доки кеш не вкладеться у ліміт."""
+    limit = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith((".parquet", ".pkl")):
+            continue
+        p = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(e[1] for e in entries)
+    keep_path = _entry_path(keep) if keep else None
+    for _, size, p in sorted(entries):
+        if total <= limit:
+            break
+        if p == keep_path:
+            continue
+        try:
+            os.remove(p)
+        except OSError:
+            continue
+        total -= size
+        _count("evicted")
+
+
+def cached_parse(data: bytes, parse_fn) -> pd.DataFrame:
+    """Повертає нормалізований фрейм залишків: з кешу або через parse_fn(data)."""
+    key = content_key(data)
+    df = cache_get(key)
+    if df is not None:
+        print(f"[CACHE] hit {key[:12]}")
+        return df
+    print(f"[CACHE] miss {key[:12]}")
+    df = normalized(parse_fn(data))
+    try:
+        cache_put(key, df)
+    except Exception as e:
+        print("[CACHE ERROR]", e)
+    return df
+
+
+def stats_line() -> str:
+    return f"[CACHE] hit={STATS['hit']} miss={STATS['miss']} evicted={STATS['evicted']}"
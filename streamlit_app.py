@@ -16,9 +16,9 @@ with st.sidebar:
 st.subheader("1) Вхідні файли")
 c1, c2 = st.columns(2)
 with c1:
-    stock_file = st.file_uploader("Excel із залишками (export_limits.xlsx / .xls)", type=["xlsx","xls"])
+    stock_file = st.file_uploader("Залишки (export_limits.xlsx / .xls / .ods / .csv)", type=["xlsx","xls","ods","csv","tsv"])
 with c2:
-    suppliers_file = st.file_uploader("suppliers.csv або .xlsx/.xls", type=["csv","xlsx","xls"])
+    suppliers_file = st.file_uploader("suppliers.csv або .xlsx/.xls", type=["csv","xlsx","xls","ods"])
 
 col_run, col_send = st.columns(2)
 btn_run = col_run.button("🔢 Розрахувати")
@@ -34,19 +34,28 @@ def save_upload(f, name):
 if "paths" not in st.session_state:
     st.session_state.paths = {}
 
-def compute_and_show(stock_path, suppliers_path):
-    oe.OUT_DIR = out_dir or "out"; os.makedirs(oe.OUT_DIR, exist_ok=True)
-    oe.DRY_RUN = 1 if dry_run else 0
-    oe.TELEGRAM_BOT_TOKEN = tg_token or ""
-    oe.TELEGRAM_CHAT_ID = tg_chat or "555406850"
+def session_config():
+    # Конфігурація саме цієї сесії — глобали order_engine не чіпаємо
+    return oe.EngineConfig(
+        out_dir=out_dir or "out",
+        dry_run=1 if dry_run else 0,
+        telegram_bot_token=tg_token or "",
+        telegram_chat_id=tg_chat or "555406850",
+        rebalance=oe.REBALANCE,
+    )
 
-    po_a, po_b, missing = oe.process_and_send(stock_path, suppliers_path)  # зберігає та (якщо DRY_RUN=0) шле у TG
-    st.success("Готово. Файли сформовані у OUT_DIR. Попередній перегляд нижче.")
+def compute_and_show(stock_path, suppliers_path):
+    cfg = session_config()
+    # Кожен запуск — своя підпапка OUT_DIR/<run_id>: паралельні сесії не перетирають файли
+    res = oe.run_engine(stock_path, suppliers_path, cfg)  # зберігає та (якщо DRY_RUN=0) шле у TG
+    po_a, po_b, missing, transfers = res.po_a, res.po_b, res.missing, res.transfers
+    st.session_state.paths = {}
+    st.success(f"Готово. Файли сформовані у {res.out_dir}. Попередній перегляд нижче.")
 
     if not po_a.empty:
         st.subheader("PO — Боголюбова")
         st.dataframe(po_a, use_container_width=True)
-        xlsx_a = os.path.join(oe.OUT_DIR, "PO_Боголюбова.xlsx")
+        xlsx_a = res.files["po_a"]
         st.download_button("⬇️ Завантажити PO_Боголюбова.xlsx", data=open(xlsx_a, "rb").read(),
                            file_name="PO_Боголюбова.xlsx")
         st.session_state.paths["a"] = xlsx_a
@@ -56,20 +65,37 @@ def compute_and_show(stock_path, suppliers_path):
     if not po_b.empty:
         st.subheader("PO — Європейська, 31а")
         st.dataframe(po_b, use_container_width=True)
-        xlsx_b = os.path.join(oe.OUT_DIR, "PO_Європейська_31а.xlsx")
+        xlsx_b = res.files["po_b"]
         st.download_button("⬇️ Завантажити PO_Європейська_31а.xlsx", data=open(xlsx_b, "rb").read(),
                            file_name="PO_Європейська_31а.xlsx")
         st.session_state.paths["b"] = xlsx_b
     else:
         st.info("Для магазину Європейська, 31а замовлень немає.")
 
+    if not transfers.empty:
+        st.subheader("Переміщення між магазинами")
+        st.dataframe(transfers, use_container_width=True)
+        xlsx_t = res.files["transfers"]
+        st.download_button("⬇️ Завантажити TRANSFERS.xlsx", data=open(xlsx_t, "rb").read(),
+                           file_name="TRANSFERS.xlsx")
+        st.session_state.paths["t"] = xlsx_t
+
+    if not res.deferred.empty:
+        st.subheader("Відкладені замовлення (нижче мінімуму постачальника)")
+        st.warning("Ці позиції не потрапили в PO — замовлення постачальнику перенесено на наступну доставку.")
+        st.dataframe(res.deferred, use_container_width=True)
+        xlsx_d = res.files["deferred"]
+        st.download_button("⬇️ Завантажити DEFERRED.xlsx", data=open(xlsx_d, "rb").read(),
+                           file_name="DEFERRED.xlsx")
+        st.session_state.paths["d"] = xlsx_d
+
     st.subheader("Товари без постачальника")
     if missing.empty:
         st.success("Всі товари мають постачальника ✅")
     else:
         st.warning("Є товари без постачальника — доповніть у suppliers.csv")
         st.dataframe(missing, use_container_width=True)
-        xlsx_m = os.path.join(oe.OUT_DIR, "MISSING_SUPPLIERS.xlsx")
+        xlsx_m = res.files["missing"]
         st.download_button("⬇️ Завантажити MISSING_SUPPLIERS.xlsx", data=open(xlsx_m, "rb").read(),
                            file_name="MISSING_SUPPLIERS.xlsx")
         st.session_state.paths["m"] = xlsx_m
@@ -91,15 +117,12 @@ if btn_send:
     if not st.session_state.get("paths"):
         st.warning("Спершу натисніть «Розрахувати».")
     else:
-        oe.DRY_RUN = 1 if dry_run else 0
-        oe.TELEGRAM_BOT_TOKEN = tg_token or ""
-        oe.TELEGRAM_CHAT_ID = tg_chat or "555406850"
-        from order_engine import tg_send_message, tg_send_document
-        tg_send_message("<b>AI Beer Stock Manager</b>\nВідправлення сформованих XLSX.")
-        for key in ["a", "b", "m"]:
+        cfg = session_config()
+        oe.tg_send_message("<b>AI Beer Stock Manager</b>\nВідправлення сформованих XLSX.", cfg=cfg)
+        for key in ["a", "b", "t", "d", "m"]:
             p = st.session_state.paths.get(key)
             if p and os.path.exists(p):
-                tg_send_document(p, caption=f"<code>{os.path.basename(p)}</code>")
+                oe.tg_send_document(p, caption=f"<code>{os.path.basename(p)}</code>", cfg=cfg)
         if dry_run:
             st.info("DRY_RUN=1 — надсилання лише у логах.")
         else:
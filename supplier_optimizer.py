@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Оптимізація замовлень з урахуванням обмежень постачальника.
+
+Розширена схема suppliers (усі колонки, крім product_name/supplier_name, — опційні):
+- pack_size      — базова кратність (як і раніше)
+- pack_tiers     — варіанти тари через «;», напр. «1;6;24» (пляшка / ящик / кег)
+- price          — ціна за одиницю
+- min_order      — мінімальна сума замовлення у постачальника
+- delivery_days  — дні доставки, напр. «пн,чт» або «1,4» (1 = понеділок)
+
+Логіка (векторно; постачальники обробляються пакетами через groupby):
+1) Потреба кожного рядка покривається комбінацією тар з мінімальним
+   перевищенням, за рівності — меншою кількістю упаковок.
+2) Якщо сума замовлення постачальника нижча за min_order — підтягуємо
+   наперед позиції цього ж постачальника з найменшим запасом (до
+   ліміт × (1 + PULL_FORWARD_RATIO)), доки не досягнемо мінімуму.
+3) Якщо мінімуму не досягти і немає критичних позицій (залишок 0) —
+   замовлення відкладається до наступної доставки.
+
+ENV:
+- PULL_FORWARD_RATIO=0.5
+- DEFER_BELOW_MIN=1|0
+"""
+
+import os, re, datetime as dt, numpy as np, pandas as pd
+
+PULL_FORWARD_RATIO = float(os.getenv("PULL_FORWARD_RATIO", "0.5"))
+DEFER_BELOW_MIN = int(os.getenv("DEFER_BELOW_MIN", "1"))
+
+DECISION_ORDER = "замовити"
+DECISION_PULLED = "підтягнуто до мінімуму"
+DECISION_BELOW_MIN = "нижче мінімуму (критичний залишок)"
+DECISION_DEFERRED = "відкладено"
+
+_WEEKDAYS = {
+    "пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5, "нд": 6,
+    "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6,
+}
+
+
+def parse_tiers(val, pack_size=1) -> tuple:
+    """«1;6;24» -> (24, 6, 1). Порожнє значення -> (pack_size,)."""
+    sizes = set()
+    if isinstance(val, str):
+        for tok in re.split(r"[;|/, ]+", val):
+            try:
+                v = int(float(tok))
+            except ValueError:
+                continue
+            if v > 0:
+                sizes.add(v)
+    if not sizes:
+        sizes.add(max(int(pack_size or 1), 1))
+    return tuple(sorted(sizes, reverse=True))
+
+
+def parse_delivery_days(val) -> tuple:
+    """«пн,чт» / «Mon,Thu» / «1,4» -> (0, 3). Порожнє — доставка щодня."""
+    if not isinstance(val, str) or not val.strip():
+        return ()
+    out = set()
+    for tok in re.split(r"[;|/, ]+", val.strip().lower()):
+        if tok.isdigit() and 1 <= int(tok) <= 7:
+            out.add(int(tok) - 1)
+        elif tok[:3] in _WEEKDAYS:
+            out.add(_WEEKDAYS[tok[:3]])
+        elif tok[:2] in _WEEKDAYS:
+            out.add(_WEEKDAYS[tok[:2]])
+    return tuple(sorted(out))
+
+
+def next_delivery(days: tuple, today: dt.date = None, skip: int = 0) -> dt.date:
+    """Найближча (skip=1 — наступна за нею) дата доставки після сьогодні."""
+    today = today or dt.date.today()
+    found = -1
+    for i in range(1, 15):
+        d = today + dt.timedelta(days=i)
+        if not days or d.weekday() in days:
+            found += 1
+            if found == skip:
+                return d
+    return today + dt.timedelta(days=1)
+
+
+def pack_plan(need: np.ndarray, tiers: tuple):
+    """
+    Покриття потреби тарами tiers (за спаданням).
+    Кандидат (s, i): тари більші за s пропускаємо, жадібно floor по тарах
+    s..i-1, ceil на тарі i. Тар небагато, тож перебір дешевий і векторний.
+    Повертає (кількість, матриця к-сті упаковок (N, len(tiers))).
+    """
+    need = np.clip(np.round(np.asarray(need, dtype=float), 9), 0, None)
+    t = np.asarray(tiers, dtype=float)
+    best_qty = np.full(need.shape, np.inf)
+    best_packs = np.full(need.shape, np.inf)
+    best_counts = np.zeros((len(need), len(t)))
+    for s in range(len(t)):
+        for i in range(s, len(t)):
+            counts = np.zeros((len(need), len(t)))
+            rem = need.copy()
+            for j in range(s, i):
+                c = np.floor(rem / t[j])
+                counts[:, j] = c
+                rem = rem - c * t[j]
+            counts[:, i] = np.ceil(np.clip(rem, 0, None) / t[i])
+            qty = counts @ t
+            packs = counts.sum(axis=1)
+            better = (qty < best_qty) | ((qty == best_qty) & (packs < best_packs))
+            best_qty = np.where(better, qty, best_qty)
+            best_packs = np.where(better, packs, best_packs)
+            best_counts[better] = counts[better]
+    best_qty[need <= 0] = 0
+    best_counts[need <= 0] = 0
+    return best_qty, best_counts
+
+
+def _plan_text(counts_row, tiers) -> str:
+    return " + ".join(f"{int(c)}×{t}" for c, t in zip(counts_row, tiers) if c > 0)
+
+
+def _apply_packs(m: pd.DataFrame, need_col: str):
+    """Рахує order_qty/pack_plan пакетами за однаковим набором тар."""
+    qty = pd.Series(0.0, index=m.index)
+    plan = pd.Series("", index=m.index)
+    for tiers, idx in m.groupby("_tiers").groups.items():
+        q, counts = pack_plan(m.loc[idx, need_col].to_numpy(), tiers)
+        qty.loc[idx] = q
+        plan.loc[idx] = [_plan_text(r, tiers) for r in counts]
+    return qty, plan
+
+
+def has_constraints(df_sup: pd.DataFrame) -> bool:
+    """Чи є у довіднику щось понад pack_size (інакше формат PO не змінюємо).
+    Будь-яке непорожнє pack_tiers — обмеження, навіть одна тара («24» — лише кег)."""
+    if df_sup.empty:
+        return False
+    return bool(
+        (df_sup["price"] > 0).any() or (df_sup["min_order"] > 0).any()
+        or df_sup["pack_tiers"].fillna("").astype(str).str.strip().ne("").any()
+        or df_sup["delivery_days"].fillna("").astype(str).str.strip().ne("").any()
+    )
+
+
+def optimize_orders(m: pd.DataFrame, today: dt.date = None) -> pd.DataFrame:
+    """
+    m — рядки одного магазину з колонками need, stock_qty, inbound,
+    _limit_per_store, supplier_name, pack_size, pack_tiers, price, min_order,
+    delivery_days. Додає order_qty, pack_plan, order_value, delivery_date,
+    decision, reason.
+    """
+    m = m.copy()
+    m["_tiers"] = [parse_tiers(v, p) for v, p in zip(m["pack_tiers"], m["pack_size"])]
+    m["order_qty"], m["pack_plan"] = _apply_packs(m, "need")
+    m["order_value"] = m["order_qty"] * m["price"]
+    m["decision"] = np.where(m["order_qty"] > 0, DECISION_ORDER, "")
+    m["reason"] = ""
+
+    # Мінімальна сума — на рівні постачальника
+    g = m.groupby("supplier_name")
+    sup_value = g["order_value"].transform("sum")
+    sup_min = g["min_order"].transform("max")
+    sup_has_price = g["price"].transform("max") > 0
+    below = (sup_min > 0) & sup_has_price & (sup_value > 0) & (sup_value < sup_min)
+
+    if below.any():
+        # Кандидати на «підтягування»: добираємо до ліміт × (1 + ratio)
+        cap = m["_limit_per_store"] * (1 + PULL_FORWARD_RATIO)
+        m["_ext_need"] = (cap - m["stock_qty"] - m["inbound"]).clip(lower=0).where(below, 0)
+        m["_ext_need"] = np.maximum(m["_ext_need"], m["need"])
+        ext_qty, ext_plan = _apply_packs(m, "_ext_need")
+        extra_value = ((ext_qty - m["order_qty"]).clip(lower=0) * m["price"]).where(below, 0)
+
+        # Спершу ті, у кого найменше покриття запасу
+        cover = (m["stock_qty"] + m["inbound"]) / m["_limit_per_store"].replace(0, np.nan)
+        order = m.assign(_cover=cover.fillna(np.inf), _extra=extra_value) \
+                 .sort_values(["supplier_name", "_cover"])
+        before = order.groupby("supplier_name")["_extra"].cumsum() - order["_extra"]
+        gap = (sup_min - sup_value).reindex(order.index)
+        take = (before < gap) & (order["_extra"] > 0)
+        take = take.reindex(m.index, fill_value=False)
+
+        pulled_value = extra_value.where(take, 0).groupby(m["supplier_name"]).transform("sum")
+        reached = below & (sup_value + pulled_value >= sup_min)
+
+        pull = take & reached
+        m.loc[pull, "order_qty"] = ext_qty[pull]
+        m.loc[pull, "pack_plan"] = ext_plan[pull]
+        m.loc[pull, "decision"] = DECISION_PULLED
+
+        # Мінімум недосяжний: відкладаємо, якщо немає нульових залишків
+        rest = below & ~reached & (m["order_qty"] > 0)
+        critical = ((m["stock_qty"] + m["inbound"] <= 0) & rest).groupby(m["supplier_name"]).transform("any")
+        defer = rest & ~critical & bool(DEFER_BELOW_MIN)
+        m.loc[rest & ~defer, "decision"] = DECISION_BELOW_MIN
+        m.loc[defer, "decision"] = DECISION_DEFERRED
+        short = (sup_min - sup_value).round(2).astype(str)
+        m.loc[rest, "reason"] = "до мінімуму бракує " + short[rest]
+        m["order_value"] = m["order_qty"] * m["price"]
+
+    days = {s: parse_delivery_days(v) for s, v in
+            m.groupby("supplier_name")["delivery_days"].first().items()}
+    first = {s: next_delivery(d, today) for s, d in days.items()}
+    second = {s: next_delivery(d, today, skip=1) for s, d in days.items()}
+    deferred = m["decision"].eq(DECISION_DEFERRED)
+    m["delivery_date"] = [
+        str(second[s] if d else first[s]) for s, d in zip(m["supplier_name"], deferred)
+    ]
+    return m.drop(columns=["_tiers", "_ext_need"], errors="ignore")
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Telegram-бот у режимі long polling: відповіді на запити по залишках
+без повторного читання Excel.
+
+Останні розпарсені залишки та PO тримаються в пам'яті (StockIndex):
+- префіксний індекс нормалізованих назв (відсортований масив ключів + bisect;
+  ключ є для кожного слова назви, тож «/stock іпа» знайде «КЛЕПКА ІПА»)
+- масиви по магазинах (залишок, ліміт, одиниця)
+Коли з'являється новий експорт, індекс будується у фоновому потоці й
+підміняється атомарно — запити завжди бачать цілісний знімок.
+
+Команди:
+  /stock <назва>   — залишки по магазинах
+  /order <магазин> — що замовляємо (боголюбова / європейська)
+  /missing         — товари без постачальника
+
+ENV:
+- TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID (відповідаємо лише дозволеним чатам)
+- BOT_ALLOWED_CHATS=id1,id2 (за замовчуванням — TELEGRAM_CHAT_ID)
+- BOT_STOCK_GLOB=out/**/export_limits*.*  (звідки брати найсвіжіший експорт)
+- SUPPLIERS_PATH=suppliers.csv
+- BOT_REFRESH_SEC=30
+- TELEGRAM_API_BASE (див. order_engine)
+"""
+
+import os, re, glob, html, time, bisect, threading, unicodedata, pathlib, sys
+import numpy as np, pandas as pd, requests
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+import order_engine as oe
+import stock_cache
+
+BOT_STOCK_GLOB = os.getenv("BOT_STOCK_GLOB", os.path.join(oe.OUT_DIR, "**", "export_limits*.*"))
+SUPPLIERS_PATH = os.getenv("SUPPLIERS_PATH", "suppliers.csv")
+BOT_REFRESH_SEC = float(os.getenv("BOT_REFRESH_SEC", "30"))
+BOT_ALLOWED_CHATS = {c.strip() for c in os.getenv("BOT_ALLOWED_CHATS", oe.TELEGRAM_CHAT_ID).split(",") if c.strip()}
+POLL_TIMEOUT = 30
+MAX_ROWS = 15
+
+
+def normalize_name(s) -> str:
+    s = unicodedata.normalize("NFKC", str(s)).casefold().replace("’", "'").replace("ʼ", "'")
+    return " ".join(re.sub(r"[^\w'.,]+", " ", s).split())
+
+
+class StockIndex:
+    """Незмінний знімок залишків і PO; будується один раз, далі лише читання."""
+
+    def __init__(self, df_stock: pd.DataFrame, po_a=None, po_b=None, missing=None, source: str = ""):
+        self.source = source
+        self.built_at = time.strftime("%Y-%m-%d %H:%M")
+        self.names = df_stock["product_name"].astype(str).to_numpy()
+        self.qty = {oe.STORE_A_NAME: df_stock["_qty_a"].to_numpy(dtype=float),
+                    oe.STORE_B_NAME: df_stock["_qty_b"].to_numpy(dtype=float)}
+        self.limit = df_stock["_limit_per_store"].to_numpy(dtype=float)
+        self.unit = df_stock["_unit"].astype(str).to_numpy()
+        self.orders = {oe.STORE_A_NAME: po_a if po_a is not None else pd.DataFrame(),
+                       oe.STORE_B_NAME: po_b if po_b is not None else pd.DataFrame()}
+        self.missing = missing if missing is not None else pd.DataFrame()
+
+        # Префіксний індекс: ключ для кожної позиції слова в назві
+        keys = []
+        for i, name in enumerate(self.names):
+            words = normalize_name(name).split()
+            for w in range(len(words)):
+                keys.append((" ".join(words[w:]), i))
+        keys.sort()
+        self._keys = [k for k, _ in keys]
+        self._rows = np.array([i for _, i in keys], dtype=np.int64)
+
+    def search(self, query: str, limit: int = MAX_ROWS) -> list:
+        q = normalize_name(query)
+        if not q:
+            return []
+        lo = bisect.bisect_left(self._keys, q)
+        hi = bisect.bisect_left(self._keys, q + "\uffff")
+        rows = dict.fromkeys(self._rows[lo:hi].tolist())  # унікальні, у порядку ключів
+        return list(rows)[:limit]
+
+    def store(self, query: str):
+        # Збіг з будь-яким словом назви: «бог», «європ», «31а»
+        words = re.findall(r"\w+", normalize_name(query))
+        if not words:
+            return None
+        q = words[0][:4]
+        for name in self.orders:
+            if any(w.startswith(q) for w in re.findall(r"\w+", normalize_name(name))):
+                return name
+        return None
+
+
+class IndexHolder:
+    """Тримає поточний StockIndex; заміна — одне присвоєння під локом."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def get(self) -> StockIndex:
+        return self._index
+
+    def swap(self, index: StockIndex):
+        with self._lock:
+            self._index = index
+
+
+def build_index(stock_path: str, suppliers_path: str = None, cfg: oe.EngineConfig = None) -> StockIndex:
+    cfg = cfg or oe.EngineConfig.from_env()
+    with open(stock_path, "rb") as f:
+        data = f.read()
+    df_stock = stock_cache.cached_parse(data, oe.read_stock_excel)
+    df_sup = oe.read_suppliers_any(suppliers_path or SUPPLIERS_PATH)
+    df_calc = df_stock
+    if cfg.rebalance:
+        df_calc, _ = oe.rebalance_stock(df_stock)
+    po_a, po_b, missing = oe.compute_orders_and_missing(df_calc, df_sup)
+    return StockIndex(df_stock, po_a, po_b, missing, source=os.path.basename(stock_path))
+
+
+def latest_export(pattern: str = None):
+    files = glob.glob(pattern or BOT_STOCK_GLOB, recursive=True)
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def _fmt(x) -> str:
+    xf = float(x)
+    return f"{int(xf)}" if xf.is_integer() else f"{xf:.2f}"
+
+
+# --------- відповіді на команди ---------
+def answer(index: StockIndex, text: str) -> str:
+    if index is None:
+        return "Дані ще не завантажені — зачекайте на експорт залишків."
+    cmd, _, arg = (text or "").strip().partition(" ")
+    cmd = cmd.split("@")[0].lower()
+    arg = arg.strip()
+
+    if cmd == "/stock":
+        if not arg:
+            return "Використання: /stock &lt;назва&gt;"
+        rows = index.search(arg)
+        if not rows:
+            return f"Не знайдено: <i>{html.escape(arg)}</i>"
+        lines = []
+        for i in rows:
+            per_store = ", ".join(f"{html.escape(s)}: {_fmt(q[i])}" for s, q in index.qty.items())
+            lines.append(f"• <b>{html.escape(index.names[i])}</b> — {per_store} {html.escape(index.unit[i])} "
+                         f"(ліміт {_fmt(index.limit[i])})")
+        return "\n".join(lines)
+
+    if cmd == "/order":
+        store = index.store(arg) if arg else None
+        if not store:
+            return "Використання: /order боголюбова | європейська"
+        po = index.orders[store]
+        if po.empty:
+            return f"Магазин {html.escape(store)}: замовлення не потрібне."
+        lines = [f"<b>{html.escape(store)}</b>: {len(po)} позицій"]
+        head = po.head(MAX_ROWS * 2)
+        for name, qty, unit, sup in zip(head["Інгредієнти"], head["Замовити"], head["Одиниця"], head["Постачальник"]):
+            lines.append(f"• {html.escape(str(name))} — {_fmt(qty)} {html.escape(str(unit))} ({html.escape(str(sup))})")
+        if len(po) > MAX_ROWS * 2:
+            lines.append(f"… ще {len(po) - MAX_ROWS * 2}")
+        return "\n".join(lines)
+
+    if cmd == "/missing":
+        if index.missing.empty:
+            return "Всі товари мають постачальника ✅"
+        names = index.missing["Інгредієнти"].astype(str).tolist()
+        lines = [f"Без постачальника: {len(names)}"] + [f"• {html.escape(n)}" for n in names[:MAX_ROWS * 2]]
+        return "\n".join(lines)
+
+    return ("Команди:\n/stock &lt;назва&gt; — залишки\n/order &lt;магазин&gt; — замовлення\n"
+            f"/missing — без постачальника\n<i>Дані: {html.escape(index.source)} ({index.built_at})</i>")
+
+
+# --------- long polling ---------
+class Bot:
+    def __init__(self, cfg: oe.EngineConfig = None, holder: IndexHolder = None, allowed_chats=None):
+        self.cfg = cfg or oe.EngineConfig.from_env()
+        self.holder = holder or IndexHolder()
+        self.allowed = {str(c) for c in (allowed_chats if allowed_chats is not None else BOT_ALLOWED_CHATS)}
+        self.offset = 0
+        self.session = requests.Session()
+        self._stop = threading.Event()
+        self._loaded = None
+
+    def refresh(self, pattern: str = None) -> bool:
+        """Перебудовує індекс, якщо з'явився новіший експорт."""
+        path = latest_export(pattern)
+        if not path:
+            return False
+        key = (path, os.path.getmtime(path))
+        if key == self._loaded:
+            return False
+        self.holder.swap(build_index(path, cfg=self.cfg))
+        self._loaded = key
+        print("[BOT] index refreshed:", path)
+        return True
+
+    def _refresh_loop(self):
+        while not self._stop.wait(BOT_REFRESH_SEC):
+            try:
+                self.refresh()
+            except Exception as e:
+                print("[BOT REFRESH ERROR]", e)
+
+    def poll_once(self, timeout: int = POLL_TIMEOUT) -> int:
+        r = self.session.get(oe.tg_api("getUpdates", self.cfg),
+                             params={"offset": self.offset, "timeout": timeout}, timeout=timeout + 10)
+        r.raise_for_status()
+        updates = r.json().get("result", [])
+        for upd in updates:
+            self.offset = max(self.offset, upd["update_id"] + 1)
+            msg = upd.get("message") or {}
+            chat_id = str((msg.get("chat") or {}).get("id", ""))
+            text = msg.get("text") or ""
+            if not chat_id or not text.startswith("/"):
+                continue
+            if self.allowed and chat_id not in self.allowed:
+                continue
+            reply = answer(self.holder.get(), text)
+            self.session.post(oe.tg_api("sendMessage", self.cfg), data={
+                "chat_id": chat_id, "text": reply[:4000], "parse_mode": "HTML", "disable_web_page_preview": True,
+            }, timeout=30).raise_for_status()
+        return len(updates)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print("[BOT REFRESH ERROR]", e)
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        print("[BOT] polling…")
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except requests.RequestException as e:
+                print("[BOT POLL ERROR]", e)
+                self._stop.wait(5)
+
+
+if __name__ == "__main__":
+    Bot().run()
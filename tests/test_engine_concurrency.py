@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+import order_engine as oe
+
+THREADS = 8
+PROCS = 3
+PRODUCTS = 5
+
+
+def _names(k):
+    return [f"Товар-{k}-{j}" for j in range(PRODUCTS)]
+
+
+def _write_stock(path, k):
+    # Нульові залишки в обох магазинах -> кожен товар потрапляє в обидва PO
+    rows = ["Звіт про залишки", "Інгредієнти,Категорія,Боголюбова,\"Європейська, 31а\",Ліміт"]
+    rows += [f"{n},Пиво,0 шт,0 шт,10 шт" for n in _names(k)]
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+
+def _run(stock_path, suppliers_path, out_dir):
+    cfg = oe.EngineConfig(out_dir=out_dir, dry_run=1, rebalance=0)
+    res = oe.run_engine(stock_path, suppliers_path, cfg, send=False)
+    return res.out_dir, sorted(res.po_a["Інгредієнти"]), sorted(res.po_b["Інгредієнти"]), res.files
+
+
+def test_run_engine_threads_and_processes(tmp_path):
+    jobs = THREADS + PROCS
+    pd.DataFrame({
+        "product_name": [n for k in range(jobs) for n in _names(k)],
+        "supplier_name": "Пивзавод",
+        "pack_size": 1,
+    }).to_csv(tmp_path / "suppliers.csv", index=False)
+    stocks = []
+    for k in range(jobs):
+        _write_stock(tmp_path / f"stock_{k}.csv", k)
+        stocks.append(str(tmp_path / f"stock_{k}.csv"))
+    out = str(tmp_path / "out")
+    sup = str(tmp_path / "suppliers.csv")
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(lambda k: _run(stocks[k], sup, out), range(THREADS)))
+    # spawn: дочірні процеси не успадковують стан потоків батьківського
+    with ProcessPoolExecutor(PROCS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results += list(pool.map(_run, stocks[THREADS:], [sup] * PROCS, [out] * PROCS))
+
+    assert len({r[0] for r in results}) == jobs
+    for k, (out_dir, po_a, po_b, files) in enumerate(results):
+        assert po_a == po_b == sorted(_names(k))
+        assert set(files) >= {"po_a", "po_b"}
+        for path in files.values():
+            assert os.path.dirname(path) == out_dir and os.path.exists(path)
+        saved = pd.read_excel(files["po_a"])
+        assert sorted(saved["Інгредієнти"]) == sorted(_names(k))
@@ -0,0 +1,192 @@
+import base64
+import datetime as dt
+import io
+import json
+import os
+import re
+import socketserver
+import threading
+
+import pandas as pd
+import pytest
+
+import imap_backfill as ib
+
+MESSAGES = 2000
+DISTINCT = 20
+UIDVALIDITY = 777
+TEXT_PART = '("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 5 1 NIL NIL NIL NIL)'
+
+
+def _export(i) -> bytes:
+    df = pd.DataFrame({
+        "Інгредієнти": [f"Товар {k}" for k in range(10)],
+        "Категорія": "Пиво",
+        "Склад Боголюбова": [f"{(k + i) % 9} шт" for k in range(10)],
+        "Склад Європейська, 31а": ["1 шт"] * 10,
+        "Ліміт": [f"{8 + i} шт"] * 10,   # вміст різний для кожного i
+    })
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+class Mailbox:
+    """Синтетична пошта: кожен 3-й лист — з export_limits, решта — без або з PDF."""
+
+    def __init__(self, n):
+        files = [_export(i) for i in range(DISTINCT)]
+        start = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+        self.msgs, self.exports = {}, {}
+        self.structure_fetched = set()
+        for uid in range(1, n + 1):
+            date = start + dt.timedelta(hours=uid * 3)
+            if uid % 3 == 0:
+                self.exports[uid] = uid % DISTINCT
+                b64 = base64.encodebytes(files[uid % DISTINCT])
+                # Частина імен — кирилицею, як IMAP-літерал {n}
+                fname = f"export_limits_{uid}.xlsx" if uid % 2 else f"export_limits_склад_{uid}.xlsx"
+                raw = fname.encode("utf-8")
+                name = f'"{fname}"' if fname.isascii() else ("{%d}\r\n" % len(raw), raw)
+                body = ["(" + TEXT_PART + '("APPLICATION" "OCTET-STREAM" NIL NIL NIL "BASE64" '
+                        f'{len(b64)} NIL ("ATTACHMENT" ("FILENAME" ', name,
+                        ')) NIL NIL) "MIXED" ("BOUNDARY" "xx") NIL NIL NIL)']
+                parts = {"1": b"hello", "2": b64}
+            elif uid % 3 == 1:
+                body, parts = [TEXT_PART], {"1": b"hello"}
+            else:
+                body = ["(" + TEXT_PART + '("APPLICATION" "PDF" ("NAME" "invoice.pdf") NIL NIL "BASE64" 8 NIL '
+                        '("ATTACHMENT" ("FILENAME" "invoice.pdf")) NIL NIL) "MIXED" ("BOUNDARY" "xx") NIL NIL NIL)']
+                parts = {"1": b"hello", "2": b"AAAAAAAA"}
+            self.msgs[uid] = (date, body, parts)
+
+
+def _uid_set(spec, uids):
+    out = []
+    for chunk in spec.split(","):
+        if ":" in chunk:
+            a, b = chunk.split(":")
+            out += [u for u in uids if int(a) <= u <= (uids[-1] if b == "*" else int(b))]
+        else:
+            out.append(int(chunk))
+    return out
+
+
+def _handler(box):
+    class IMAPStandIn(socketserver.StreamRequestHandler):
+        def send(self, *chunks):
+            for c in chunks:
+                self.wfile.write(c if isinstance(c, bytes) else c.encode("utf-8"))
+
+        def handle(self):
+            self.send("* OK IMAP4rev1 stand-in ready\r\n")
+            uids = sorted(box.msgs)
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                tag, cmd, *args = line.decode().strip().split(" ")
+                cmd = cmd.upper()
+                if cmd == "CAPABILITY":
+                    self.send("* CAPABILITY IMAP4rev1\r\n", f"{tag} OK done\r\n")
+                elif cmd == "LOGIN":
+                    self.send(f"{tag} OK logged in\r\n")
+                elif cmd in ("SELECT", "EXAMINE"):
+                    self.send(f"* {len(uids)} EXISTS\r\n* OK [UIDVALIDITY {UIDVALIDITY}] ok\r\n",
+                              f"{tag} OK [READ-ONLY] done\r\n")
+                elif cmd == "LOGOUT":
+                    self.send("* BYE\r\n", f"{tag} OK bye\r\n")
+                    return
+                elif cmd == "UID" and args[0].upper() == "SEARCH":
+                    self.send("* SEARCH " + " ".join(map(str, uids)) + "\r\n", f"{tag} OK done\r\n")
+                elif cmd == "UID" and args[0].upper() == "FETCH":
+                    what = " ".join(args[2:]).upper()
+                    for uid in _uid_set(args[1], uids):
+                        date, body, parts = box.msgs[uid]
+                        seq = uids.index(uid) + 1
+                        if "BODYSTRUCTURE" in what:
+                            box.structure_fetched.add(uid)
+                            stamp = date.strftime("%d-%b-%Y %H:%M:%S +0000")
+                            self.send(f'* {seq} FETCH (UID {uid} INTERNALDATE "{stamp}" BODYSTRUCTURE ')
+                            for piece in body:
+                                self.send(*piece) if isinstance(piece, tuple) else self.send(piece)
+                            self.send(")\r\n")
+                        else:
+                            part = re.search(r"BODY\.PEEK\[([\d.]+)\]", what).group(1)
+                            data = parts.get(part, b"")
+                            self.send(f"* {seq} FETCH (UID {uid} BODY[{part}] {{{len(data)}}}\r\n", data, ")\r\n")
+                    self.send(f"{tag} OK done\r\n")
+                else:
+                    self.send(f"{tag} BAD unknown command\r\n")
+    return IMAPStandIn
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    box = Mailbox(MESSAGES)
+    srv = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _handler(box))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(ib, "IMAP_HOST", "127.0.0.1")
+    monkeypatch.setattr(ib, "IMAP_PORT", srv.server_address[1])
+    monkeypatch.setattr(ib, "IMAP_SSL", 0)
+    yield box
+    srv.shutdown()
+    srv.server_close()
+
+
+def _snapshots(archive):
+    return sorted(n for n in os.listdir(archive) if re.match(r"\d{4}-\d{2}-\d{2}_\d+\.", n))
+
+
+def _check_history(box, archive):
+    hist = ib.load_history(str(archive))
+    assert sorted(hist["uid"].unique()) == sorted(box.exports)
+    for uid in (3, 6, 1998):
+        snap = hist[hist["uid"] == uid]
+        assert snap["snapshot_date"].iloc[0].date() == box.msgs[uid][0].date()
+        i = box.exports[uid]
+        assert snap["_qty_a"].tolist() == [float((k + i) % 9) for k in range(10)]
+    assert hist.loc[hist["uid"] == 6, "filename"].iloc[0] == "export_limits_склад_6.xlsx"
+
+
+def test_full_backfill_then_resume(mailbox, tmp_path):
+    archive = tmp_path / "archive"
+    stats = ib.backfill(workers=4, procs=2, archive_dir=str(archive))
+    n_exports = len(mailbox.exports)
+    assert stats["messages"] == MESSAGES
+    assert stats["attachments"] == n_exports
+    # Однаковий вміст парситься один раз, але знімок є для кожного листа
+    assert stats["duplicates"] == n_exports - DISTINCT
+    assert stats["snapshots"] == n_exports and stats["errors"] == 0
+    assert len(_snapshots(archive)) == n_exports
+    _check_history(mailbox, archive)
+    with open(archive / ib.CHECKPOINT_NAME, encoding="utf-8") as f:
+        assert json.load(f) == {"uidvalidity": UIDVALIDITY, "done": [[1, MESSAGES]]}
+
+    # Повторний запуск — нічого робити
+    mailbox.structure_fetched.clear()
+    assert ib.backfill(workers=4, procs=2, archive_dir=str(archive))["messages"] == 0
+    assert not mailbox.structure_fetched
+
+    # «Перерваний» запуск: чекпойнт лише до 1200, знімки після — втрачено
+    cut = 1200
+    for name in _snapshots(archive):
+        if int(re.match(r"[\d-]+_(\d+)\.", name).group(1)) > cut:
+            os.remove(archive / name)
+    with open(archive / ib.CHECKPOINT_NAME, "w", encoding="utf-8") as f:
+        json.dump({"uidvalidity": UIDVALIDITY, "done": [[1, cut]]}, f)
+
+    stats = ib.backfill(workers=3, procs=2, archive_dir=str(archive))
+    assert stats["messages"] == MESSAGES - cut
+    assert min(mailbox.structure_fetched) == cut + 1
+    assert stats["snapshots"] == len([u for u in mailbox.exports if u > cut])
+    assert len(_snapshots(archive)) == n_exports
+    _check_history(mailbox, archive)
+
+
+def test_checkpoint_ignored_on_uidvalidity_change(tmp_path):
+    with open(tmp_path / ib.CHECKPOINT_NAME, "w", encoding="utf-8") as f:
+        json.dump({"uidvalidity": 1, "done": [[1, 10], [15, 20]]}, f)
+    assert ib.Checkpoint(str(tmp_path), 1).done == set(range(1, 11)) | set(range(15, 21))
+    assert ib.Checkpoint(str(tmp_path), 2).done == set()
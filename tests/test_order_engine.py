@@ -0,0 +1,173 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import order_engine as oe
+
+
+def test_semicolon_csv_with_decimal_commas():
+    # Експорт Excel в українській локалі: роздільник «;», десяткова кома
+    data = "\n".join([
+        "Залишки на 01.09.2025",
+        "Інгредієнти;Категорія;Боголюбова;Європейська, 31а;Ліміт",
+        "Пиво світле 0,5;Пиво;10,5 л;0,0 л;20,0 л",
+        "Сидр;Сидр;1,25 л;3,5 л;8 л",
+        "Чипси 70 г;Снеки;12 шт;0 шт;30 шт",
+    ]).encode("cp1251")
+    assert oe._sniff_text(data)[1] == ";"
+
+    df = oe.read_stock_excel(data)
+    assert df["product_name"].tolist() == ["Пиво світле 0,5", "Сидр", "Чипси 70 г"]
+    assert df["_qty_a"].tolist() == [10.5, 1.25, 12.0]
+    assert df["_qty_b"].tolist() == [0.0, 3.5, 0.0]
+    assert df["_limit_per_store"].tolist() == [10, 4, 15]
+    assert df["_unit"].tolist() == ["л", "л", "шт"]
+
+
+def test_comma_csv_still_detected():
+    data = 'Інгредієнти,Категорія,Боголюбова,"Європейська, 31а",Ліміт\nПиво,Пиво,2 л,3 л,10 л\n'.encode("utf-8")
+    assert oe._sniff_text(data)[1] == ","
+    assert oe.read_stock_excel(data)["_qty_b"].tolist() == [3.0]
+
+
+def test_missing_header_raises():
+    data = "a;b;c\n1;2;3\n".encode("utf-8")
+    with pytest.raises(ValueError, match="рядок заголовків"):
+        oe.read_stock_excel(data)
+
+
+def _stock(rows):
+    df = pd.DataFrame(rows, columns=["product_name", "_qty_a", "_qty_b", "_limit_per_store"])
+    return df.assign(category="Пиво", _unit="л")
+
+
+def test_rebalance_moves_min_of_surplus_and_deficit():
+    rng = np.random.default_rng(7)
+    n = 200
+    df = pd.DataFrame({
+        "product_name": [f"P{i}" for i in range(n)], "category": "Пиво", "_unit": "л",
+        "_qty_a": rng.integers(0, 30, n).astype(float),
+        "_qty_b": rng.integers(0, 30, n).astype(float),
+        "_qty_c": rng.integers(0, 30, n).astype(float),
+        "_limit_per_store": rng.integers(1, 20, n),
+    })
+    stores = [("A", "_qty_a"), ("B", "_qty_b"), ("C", "_qty_c")]
+    out, transfers = oe.rebalance_stock(df, stores=stores)
+
+    qty = df[["_qty_a", "_qty_b", "_qty_c"]].to_numpy()
+    limit = df["_limit_per_store"].to_numpy()[:, None]
+    expected = np.minimum((qty - limit).clip(min=0).sum(axis=1), (limit - qty).clip(min=0).sum(axis=1))
+    moved = transfers.groupby("Інгредієнти")["Перемістити"].sum().reindex(df["product_name"], fill_value=0)
+    np.testing.assert_allclose(moved.to_numpy(), expected)
+
+    net_in = out[["_in_qty_a", "_in_qty_b", "_in_qty_c"]].to_numpy()
+    np.testing.assert_allclose(net_in.sum(axis=1), 0, atol=1e-9)
+    # Донор не віддає більше за надлишок, одержувач не отримує більше за дефіцит
+    assert (qty + net_in >= np.minimum(qty, limit) - 1e-9).all()
+    assert (net_in <= (limit - qty).clip(min=0) + 1e-9).all()
+    assert (transfers["Звідки"] != transfers["Куди"]).all()
+
+
+def test_orders_only_remaining_need_after_transfer():
+    df = _stock([["IPA", 0, 18, 10], ["Лагер", 3, 4, 10]])
+    sup = oe.load_suppliers(pd.DataFrame({"product_name": ["IPA", "Лагер"], "supplier_name": "ACME",
+                                          "pack_size": [6, 4]}))
+    out, transfers = oe.rebalance_stock(df)
+    assert transfers.to_dict("records") == [{
+        "Інгредієнти": "IPA", "Категорія": "Пиво", "Одиниця": "л",
+        "Звідки": oe.STORE_B_NAME, "Куди": oe.STORE_A_NAME, "Перемістити": 8.0,
+    }]
+    po_a, po_b, missing = oe.compute_orders_and_missing(out, sup)
+    assert missing.empty
+    a = po_a.set_index("Інгредієнти")
+    # IPA: потреба 10 - 0 - 8 = 2 -> кратність 6; Лагер: 7 -> 8
+    assert a.loc["IPA", ["Залишок", "Переміщення", "Замовити"]].tolist() == [0, 8, 6]
+    assert a.loc["Лагер", ["Переміщення", "Замовити"]].tolist() == [0, 8]
+    # Донор (B) IPA не замовляє; Лагер: 10 - 4 = 6 -> 8
+    b = po_b.set_index("Інгредієнти")
+    assert "IPA" not in b.index and b.loc["Лагер", "Замовити"] == 8
+
+    # Без rebalance — формат без колонки переміщень
+    po_a, _, _ = oe.compute_orders_and_missing(df, sup)
+    assert "Переміщення" not in po_a.columns
+    assert po_a.set_index("Інгредієнти").loc["IPA", "Замовити"] == 12
+
+
+def _xlsx_bytes():
+    buf = io.BytesIO()
+    pd.DataFrame({"Інгредієнти": ["Пиво"], "Категорія": ["Пиво"], "Боголюбова": ["2 л"],
+                  "Європейська, 31а": ["3 л"], "Ліміт": ["10 л"]}).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def _ods_bytes():
+    # ODS: першим записом zip лежить нестиснений «mimetype»
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr(zipfile.ZipInfo("mimetype"), oe.ODS_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        z.writestr("content.xml", "<office:document-content/>", compress_type=zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+
+def test_detect_format_from_magic_bytes(tmp_path):
+    xlsx = _xlsx_bytes()
+    assert oe.detect_format(oe.MAGIC_OLE2 + b"\0" * 504) == "xls"
+    assert oe.detect_format(xlsx) == "xlsx"
+    assert oe.detect_format(b"PK\x03\x04" + b"\0" * 60) == "xlsx"
+    assert oe.detect_format(_ods_bytes()) == "ods"
+    assert oe.detect_format("Інгредієнти;Категорія\n".encode("cp1251")) == "csv"
+    # Розширення не має значення — лише вміст
+    misnamed = tmp_path / "export_limits.xls"
+    misnamed.write_bytes(xlsx)
+    assert oe.detect_format(str(misnamed)) == "xlsx"
+
+
+@pytest.fixture
+def excel_calls(monkeypatch):
+    calls = []
+    real = pd.read_excel
+
+    def recorder(src, engine=None, header=0, **kw):
+        calls.append(engine)
+        if engine == "openpyxl":
+            return real(src, engine=engine, header=header, **kw)
+        return pd.DataFrame()
+
+    monkeypatch.setattr(oe.pd, "read_excel", recorder)
+    return calls
+
+
+def test_attachment_bytes_dispatch_without_retries(excel_calls):
+    df = oe.read_stock_excel(_xlsx_bytes())
+    assert excel_calls == ["openpyxl"]
+    assert df["_qty_b"].tolist() == [3.0]
+
+    excel_calls.clear()
+    oe.read_excel_any(oe.MAGIC_OLE2 + b"\0" * 504)
+    assert excel_calls == ["xlrd"]
+
+    excel_calls.clear()
+    try:
+        import odf  # noqa
+    except ImportError:
+        with pytest.raises(RuntimeError, match="odfpy"):
+            oe.read_excel_any(_ods_bytes())
+        assert excel_calls == []
+    else:
+        oe.read_excel_any(_ods_bytes())
+        assert excel_calls == ["odf"]
+
+
+def test_csv_cp1251_after_probe():
+    # Довідник із латинським заголовком: перші 64 КБ — ASCII, кирилиця в cp1251 — у кінці
+    lines = ["product_name,supplier_name,pack_size"] + [f"Item {i},Vendor {i % 7},1" for i in range(4000)]
+    lines.append("Пиво світле 0.5 л,Пивзавод,6")
+    data = ("\n".join(lines) + "\n").encode("cp1251")
+    assert oe._sniff_text(data[:65536])[0] == "utf-8"
+
+    sup = oe.read_suppliers_any(data)
+    assert len(sup) == 4001
+    assert sup.iloc[-1][["product_name", "supplier_name", "pack_size"]].tolist() == ["Пиво світле 0.5 л", "Пивзавод", 6]
@@ -0,0 +1,171 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+import order_engine as oe
+from app import sheets
+from app.datasource import CsvDataSource, DataSource, make_source
+from app.stock_manager import build_purchase_order
+
+SHEET_ID = "S1"
+INPUT = {
+    "sales": [["date", "sku", "qty"], ["2025-08-28", "BEER-001", 12], ["2025-08-29", "BEER-001", "10"],
+              ["2025-08-28", "BEER-002", 2]],
+    "inventory": [["sku", "name", "stock"], ["BEER-001", "IPA Hoppy 0.5L", 8], ["BEER-002", "Lager", "12"]],
+    "stock": [["Залишки"], [], ["Інгредієнти", "Категорія", "Боголюбова", "Європейська, 31а", "Ліміт"],
+              ["Пиво IPA", "Пиво", "2 л", "30 л", "20 л"], ["Сидр", "Сидр", "0 шт", "0 шт", "10 шт"]],
+    "suppliers": [["product_name", "supplier_name", "pack_size"], ["Пиво IPA", "ACME", 1]],
+}
+
+
+class FakeSheets(BaseHTTPRequestHandler):
+    """Мінімальний Sheets v4 + Drive v3: batchGet, files.get (ETag/304), batchClear/batchUpdate."""
+    version = 5
+    tabs = set()
+    calls = []
+    written = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, obj, code=200, headers=None):
+        body = json.dumps(obj).encode("utf-8") if obj is not None else b""
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        assert self.headers["Authorization"] == "Bearer token"
+        self.calls.append(("GET", url.path))
+        if url.path == f"/drive/files/{SHEET_ID}":
+            etag = f'"v{self.version}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._json(None, 304)
+            return self._json({"version": str(self.version)}, headers={"ETag": etag})
+        if url.path == f"/v4/spreadsheets/{SHEET_ID}/values:batchGet":
+            assert query["valueRenderOption"] == ["UNFORMATTED_VALUE"]
+            return self._json({"valueRanges": [{"range": r, "values": INPUT[r]} for r in query["ranges"]]})
+        if url.path == f"/v4/spreadsheets/{SHEET_ID}":
+            return self._json({"sheets": [{"properties": {"title": t}} for t in sorted(self.tabs)]})
+        self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        path = unquote(url.path)
+        self.calls.append(("POST", path))
+        if path.endswith(":batchUpdate") and "/values" not in path:
+            for req in body["requests"]:
+                self.tabs.add(req["addSheet"]["properties"]["title"])
+        elif path.endswith("values:batchClear"):
+            for rng in body["ranges"]:
+                self.written.pop(rng.strip("'"), None)
+        elif path.endswith("values:batchUpdate"):
+            assert body["valueInputOption"] == "RAW"
+            for d in body["data"]:
+                tab = d["range"].rsplit("!", 1)[0].strip("'")
+                assert tab in self.tabs
+                self.written[tab] = d["values"]
+        self._json({})
+
+
+@pytest.fixture
+def api(monkeypatch):
+    FakeSheets.version, FakeSheets.tabs, FakeSheets.calls, FakeSheets.written = 5, {"sales"}, [], {}
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FakeSheets)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    monkeypatch.setattr(sheets, "SHEETS_API_BASE", base + "/v4")
+    monkeypatch.setattr(sheets, "DRIVE_API_BASE", base + "/drive")
+    yield FakeSheets
+    srv.shutdown()
+
+
+def _source(tmp_path):
+    return sheets.SheetsDataSource(SHEET_ID, token="token", cache_dir=str(tmp_path / "cache"))
+
+
+def _paths(api, method=None):
+    return [p for m, p in api.calls if method in (None, m)]
+
+
+def test_batch_get_and_revision_cache(api, tmp_path):
+    src = _source(tmp_path)
+    daily = src.read_sales_daily()
+    assert daily.groupby(level="sku").sum().to_dict() == {"BEER-001": 22, "BEER-002": 2}
+    assert src.read_inventory()["stock"].tolist() == [8, 12]
+    assert src.read_suppliers()["product_name"].tolist() == ["Пиво IPA"]
+    # Один batchGet на всі чотири діапазони, навіть після кількох read_*
+    assert _paths(api).count(f"/v4/spreadsheets/{SHEET_ID}/values:batchGet") == 1
+
+    # Нове джерело, таблиця не змінилась: Drive відповідає 304, значення — з кешу
+    api.calls.clear()
+    df = oe.read_stock_excel(_source(tmp_path).read_stock_grid())
+    assert df["product_name"].tolist() == ["Пиво IPA", "Сидр"]
+    assert df["_qty_b"].tolist() == [30.0, 0.0]
+    assert _paths(api) == [f"/drive/files/{SHEET_ID}"]
+
+    # Нова версія таблиці — перечитуємо
+    api.version = 6
+    api.calls.clear()
+    _source(tmp_path).values()
+    assert f"/v4/spreadsheets/{SHEET_ID}/values:batchGet" in _paths(api)
+
+
+def test_build_purchase_order_writes_po_back(api, tmp_path):
+    po, _ = build_purchase_order(source=_source(tmp_path))
+    assert po["sku"].tolist() == ["BEER-001"]
+    assert api.written["PO"] == [["sku", "name", "need_qty"], ["BEER-001", "IPA Hoppy 0.5L", 14]]
+    posts = _paths(api, "POST")
+    assert posts == [f"/v4/spreadsheets/{SHEET_ID}:batchUpdate", f"/v4/spreadsheets/{SHEET_ID}/values:batchClear",
+                     f"/v4/spreadsheets/{SHEET_ID}/values:batchUpdate"]
+
+
+def test_run_engine_reads_and_writes_sheets(api, tmp_path):
+    cfg = oe.EngineConfig(out_dir=str(tmp_path / "out"), dry_run=1, rebalance=1)
+    res = oe.run_engine(cfg=cfg, send=False, source=_source(tmp_path))
+    assert res.transfers["Інгредієнти"].tolist() == ["Пиво IPA"]
+    assert set(api.written) == {"PO_Боголюбова", "PO_Європейська_31а", "MISSING_SUPPLIERS", "TRANSFERS", "DEFERRED"}
+    assert api.written["MISSING_SUPPLIERS"][1][0] == "Сидр"
+    # Усі таблиці — одним batchUpdate значень
+    assert _paths(api, "POST").count(f"/v4/spreadsheets/{SHEET_ID}/values:batchUpdate") == 1
+
+
+def test_make_source(monkeypatch):
+    with pytest.raises(TypeError):
+        DataSource()
+    assert isinstance(make_source("csv", sales_path="s.csv"), CsvDataSource)
+    monkeypatch.setenv("SHEETS_SPREADSHEET_ID", SHEET_ID)
+    monkeypatch.setenv("DATA_SOURCE", "sheets")
+    assert isinstance(make_source(), sheets.SheetsDataSource)
+    with pytest.raises(ValueError):
+        make_source("ftp")
+
+
+def test_concurrent_refresh_of_the_same_sheet(api, tmp_path):
+    # Потоки одного процесу пишуть кеш тієї ж таблиці — тимчасові файли не перетинаються
+    errors = []
+
+    def refresh():
+        try:
+            _source(tmp_path).values()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    cache = tmp_path / "cache"
+    assert [p.suffix for p in cache.iterdir()] == [".json"]
+    assert json.loads(next(cache.iterdir()).read_text(encoding="utf-8"))["version"] == "5"
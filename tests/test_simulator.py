@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import simulator as sim
+
+
+def _history(qty):
+    days = pd.date_range("2025-08-01", periods=len(qty), freq="D")
+    return pd.DataFrame({"date": days.strftime("%Y-%m-%d"), "sku": "BEER-001", "qty": qty})
+
+
+GRID = sim.param_grid([2], [1], [0], [1.0, 0.5])
+
+
+def test_limit_is_the_order_up_to_level():
+    # Попит рівно 2/день: s = 2 × (2 + 1) = 6, S = max(6, ліміт × scale).
+    # Старт з нуля: дні 0-1 — дефіцит по 2, замовлення 10 приходить на день 2,
+    # далі залишок 8, 6, 4, 2, 6, 4, 2, 6 (замовлення в дні 0, 4, 7).
+    inv = pd.DataFrame({"sku": ["BEER-001"], "stock": [0], "limit": [10]})
+    res = sim.simulate(_history([2] * 5), inv, GRID, paths=3, horizon=10, seed=1).set_index("limit_scale")
+    assert res.loc[1.0, "stockout_rate"] == pytest.approx(0.2)
+    assert res.loc[1.0, "lost_sales_rate"] == pytest.approx(0.2)
+    assert res.loc[1.0, "avg_inventory"] == pytest.approx(3.8)
+    assert res.loc[1.0, "orders_per_sku_week"] == pytest.approx(2.1)
+    # Ліміт × 0.5 = 5 < s -> S = 6: щоденні дозамовлення, залишок 2
+    assert res.loc[0.5, "stockout_rate"] == pytest.approx(0.2)
+    assert res.loc[0.5, "avg_inventory"] == pytest.approx(1.8)
+
+    # Без фактичного ліміту рівень — avg × (lead + safety + cover) = 6 для обох масштабів
+    res = sim.simulate(_history([2] * 5), inv.drop(columns="limit"), GRID, paths=3, horizon=10, seed=1)
+    assert res["avg_inventory"].tolist() == pytest.approx([1.8, 1.8])
+
+    # Окремий Series лімітів має пріоритет над колонкою inventory
+    res = sim.simulate(_history([2] * 5), inv, GRID, paths=3, horizon=10, seed=1,
+                       limits=pd.Series({"BEER-001": 6}))
+    assert res["avg_inventory"].tolist() == pytest.approx([1.8, 1.8])
+
+
+def test_fixed_seed_is_reproducible():
+    hist = _history([0, 5, 1, 3, 0, 8, 2])
+    inv = pd.DataFrame({"sku": ["BEER-001"], "stock": [6], "ліміт": [12]})
+    a = sim.simulate(hist, inv, GRID, paths=50, horizon=14, seed=42)
+    b = sim.simulate(hist, inv, GRID, paths=50, horizon=14, seed=42)
+    pd.testing.assert_frame_equal(a, b)
+    assert not np.allclose(a["avg_inventory"], sim.simulate(hist, inv, GRID, paths=50, horizon=14, seed=7)["avg_inventory"])
@@ -0,0 +1,58 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import stock_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(stock_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(stock_cache, "STATS", {"hit": 0, "miss": 0, "evicted": 0})
+    return tmp_path / "cache"
+
+
+def _frame(name):
+    return pd.DataFrame({"product_name": [name], "category": ["Пиво"], "_qty_a": [1.0], "_qty_b": [2.0],
+                         "_limit_per_store": [5], "_unit": ["л"], "extra": ["x"]})
+
+
+def test_miss_then_hit_skips_parse():
+    calls = []
+
+    def parse(data):
+        calls.append(data)
+        return _frame(data.decode())
+
+    first = stock_cache.cached_parse(b"IPA", parse)
+    second = stock_cache.cached_parse(b"IPA", parse)
+    assert calls == [b"IPA"]
+    assert "extra" not in first.columns
+    pd.testing.assert_frame_equal(first, second)
+    assert stock_cache.STATS == {"hit": 1, "miss": 1, "evicted": 0}
+    assert stock_cache.stats_line() == "[CACHE] hit=1 miss=1 evicted=0"
+
+
+def test_evict_lru_keeps_just_written(cache_dir, monkeypatch):
+    keys = [stock_cache.content_key(n) for n in (b"a", b"b", b"c")]
+    for i, key in enumerate(keys[:2]):
+        stock_cache.cache_put(key, _frame(str(i)))
+    size = os.path.getsize(stock_cache._entry_path(keys[0]))
+    now = time.time()
+    os.utime(stock_cache._entry_path(keys[0]), (now - 100, now - 100))
+    os.utime(stock_cache._entry_path(keys[1]), (now - 200, now - 200))
+    # Доступ до «b» робить його свіжим — найдавнішим стає «a»
+    assert stock_cache.cache_get(keys[1]) is not None
+
+    monkeypatch.setattr(stock_cache, "CACHE_MAX_BYTES", int(size * 2.5))
+    stock_cache.cache_put(keys[2], _frame("2"))
+    assert not os.path.exists(stock_cache._entry_path(keys[0]))
+    assert os.path.exists(stock_cache._entry_path(keys[1]))
+    assert os.path.exists(stock_cache._entry_path(keys[2]))
+    assert stock_cache.STATS["evicted"] == 1
+
+    # Ліміт менший за один запис: щойно записаний залишається
+    stock_cache.evict(max_bytes=1, keep=keys[2])
+    assert os.listdir(cache_dir) == [os.path.basename(stock_cache._entry_path(keys[2]))]
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from app import stock_manager as sm
+
+
+def _late_cp1251_sales(path):
+    # 5000 ASCII-рядків (> 64 КБ проби), далі — один рядок у cp1251
+    lines = ["date,sku,qty"] + [f"2025-08-{1 + i % 28:02d},BEER-{i % 50:03d},1" for i in range(5000)]
+    lines.append("2025-08-28,ПИВО-1,7")
+    data = ("\n".join(lines) + "\n").encode("cp1251")
+    assert b"\xcf" not in data[:65536]
+    path.write_bytes(data)
+    return path
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def engine(request, monkeypatch):
+    if request.param == "pyarrow":
+        if sm.pa is None:
+            pytest.skip("pyarrow не встановлено")
+    else:
+        monkeypatch.setattr(sm, "pa", None)
+    return request.param
+
+
+def test_sales_cp1251_after_probe(tmp_path, engine):
+    daily = _late_cp1251_sales(tmp_path / "sales.csv")
+    daily = sm.read_sales_daily(str(daily))
+    assert daily.loc[("ПИВО-1", pd.Timestamp("2025-08-28"))] == 7
+    assert daily.sum() == 5000 + 7
+    assert not any("�" in sku for sku in daily.index.get_level_values("sku"))
+
+
+def test_sales_quoted_header(tmp_path, engine):
+    path = tmp_path / "sales.csv"
+    path.write_text('"date","sku","qty","note, comment"\n2025-08-01,A,2,"x, y"\n2025-08-01,A,3,z\n',
+                    encoding="utf-8")
+    daily = sm.read_sales_daily(str(path))
+    assert daily.loc[("A", pd.Timestamp("2025-08-01"))] == 5
+
+
+def test_inventory_cp1251_after_probe(tmp_path):
+    lines = ["sku,name,stock"] + [f"S{i},Item {i},{i}" for i in range(5000)] + ["S-UA,Пиво світле,3"]
+    path = tmp_path / "inventory.csv"
+    path.write_bytes(("\n".join(lines) + "\n").encode("cp1251"))
+    inv = sm._read_csv_sniffed(str(path))
+    assert inv.iloc[-1]["name"] == "Пиво світле"
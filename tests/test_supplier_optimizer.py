@@ -0,0 +1,95 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import order_engine as oe
+import supplier_optimizer as so
+
+MONDAY = dt.date(2025, 9, 1)
+
+
+@pytest.fixture(autouse=True)
+def defaults(monkeypatch):
+    monkeypatch.setattr(so, "PULL_FORWARD_RATIO", 0.5)
+    monkeypatch.setattr(so, "DEFER_BELOW_MIN", 1)
+
+
+def _lines(rows, min_order, price=10.0, days="пн,чт"):
+    # rows: (назва, залишок, ліміт)
+    df = pd.DataFrame(rows, columns=["product_name", "stock_qty", "_limit_per_store"])
+    df["stock_qty"] = df["stock_qty"].astype(float)
+    return df.assign(
+        inbound=0.0, need=(df["_limit_per_store"] - df["stock_qty"]).clip(lower=0),
+        supplier_name="ACME", pack_size=1, pack_tiers="1", price=price, min_order=min_order, delivery_days=days,
+    )
+
+
+def test_pack_plan_least_overshoot_then_fewest_packs():
+    qty, counts = so.pack_plan(np.array([25, 48, 5, 0]), (24, 6, 1))
+    assert qty.tolist() == [25, 48, 5, 0]
+    assert so._plan_text(counts[0], (24, 6, 1)) == "1×24 + 1×1"
+    assert so._plan_text(counts[1], (24, 6, 1)) == "2×24"
+    assert so._plan_text(counts[2], (24, 6, 1)) == "5×1"
+    # Без штучної тари 7 точно не покрити: найменше перевищення — 12 (2×6)
+    qty, counts = so.pack_plan(np.array([7, 20]), (24, 6))
+    assert qty.tolist() == [12, 24]
+    assert so._plan_text(counts[1], (24, 6)) == "1×24"
+
+
+def test_parse_helpers():
+    assert so.parse_tiers("1;6;24") == (24, 6, 1)
+    assert so.parse_tiers("", pack_size=4) == (4,)
+    assert so.parse_delivery_days("пн, чт") == (0, 3) == so.parse_delivery_days("Mon,Thu") == so.parse_delivery_days("1,4")
+    assert so.next_delivery((0, 3), MONDAY) == dt.date(2025, 9, 4)
+    assert so.next_delivery((0, 3), MONDAY, skip=1) == dt.date(2025, 9, 8)
+    assert so.next_delivery((), MONDAY, skip=1) == dt.date(2025, 9, 3)
+
+
+def test_single_tier_counts_as_constraint():
+    stock = pd.DataFrame({"product_name": ["Кег IPA"], "category": "Пиво", "_qty_a": [0.0], "_qty_b": [30.0],
+                          "_limit_per_store": [10], "_unit": "л"})
+    sup = oe.load_suppliers(pd.DataFrame({"product_name": ["Кег IPA"], "supplier_name": ["ACME"],
+                                          "pack_size": [1], "pack_tiers": ["24"]}))
+    assert so.has_constraints(sup)
+    po_a, _, _ = oe.compute_orders_and_missing(stock, sup)
+    row = po_a.iloc[0]
+    assert row["Замовити"] == 24 and row["Тара"] == "1×24"
+
+
+def test_pull_forward_reaches_min_order():
+    # X: потреба 5 (50 грн), Y: потреба 2 (20 грн); мінімум 100.
+    # Першим підтягується X (найменше покриття) до 15 × 1.5 - 5 = 10 -> 100 грн, разом 120
+    m = so.optimize_orders(_lines([("X", 5, 10), ("Y", 8, 10)], min_order=100), today=MONDAY).set_index("product_name")
+    assert m.loc["X", "order_qty"] == 10 and m.loc["X", "decision"] == so.DECISION_PULLED
+    assert m.loc["Y", "order_qty"] == 2 and m.loc["Y", "decision"] == so.DECISION_ORDER
+    assert m["order_value"].sum() >= 100
+    assert set(m["delivery_date"]) == {"2025-09-04"}
+
+
+def test_defer_when_no_line_is_critical():
+    m = so.optimize_orders(_lines([("X", 5, 10), ("Y", 8, 10)], min_order=1000), today=MONDAY).set_index("product_name")
+    assert set(m["decision"]) == {so.DECISION_DEFERRED}
+    assert m.loc["X", "order_qty"] == 5  # кількість не підтягується, якщо мінімум недосяжний
+    assert m.loc["X", "reason"] == "до мінімуму бракує 930.0"
+    # Відкладене — на наступну доставку після найближчої
+    assert set(m["delivery_date"]) == {"2025-09-08"}
+
+
+def test_below_min_when_a_line_has_zero_stock():
+    m = so.optimize_orders(_lines([("X", 0, 10), ("Y", 8, 10)], min_order=1000), today=MONDAY).set_index("product_name")
+    assert set(m["decision"]) == {so.DECISION_BELOW_MIN}
+    assert m["order_qty"].tolist() == [10, 2]
+    assert set(m["delivery_date"]) == {"2025-09-04"}
+
+
+def test_deferred_lines_leave_the_po():
+    stock = pd.DataFrame({"product_name": ["X", "Y"], "category": "Пиво", "_qty_a": [5.0, 8.0],
+                          "_qty_b": [10.0, 10.0], "_limit_per_store": [10, 10], "_unit": "шт"})
+    sup = oe.load_suppliers(pd.DataFrame({"product_name": ["X", "Y"], "supplier_name": "ACME",
+                                          "price": 10, "min_order": 1000}))
+    po_a, po_b, _, deferred = oe.compute_orders_and_missing(stock, sup, with_deferred=True)
+    assert po_a.empty and po_b.empty
+    assert deferred["Інгредієнти"].tolist() == ["X", "Y"]
+    assert set(deferred["Магазин"]) == {oe.STORE_A_NAME}
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import order_engine as oe
+import stock_cache
+import telegram_bot as tb
+
+TOKEN = "TEST"
+CHAT = "42"
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    updates = []
+    sent = []
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        assert url.path == f"/bot{TOKEN}/getUpdates"
+        offset = int(parse_qs(url.query).get("offset", ["0"])[0])
+        self._json({"ok": True, "result": [u for u in self.updates if u["update_id"] >= offset]})
+
+    def do_POST(self):
+        assert self.path == f"/bot{TOKEN}/sendMessage"
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        self.sent.append({k: v[0] for k, v in form.items()})
+        self._json({"ok": True, "result": {}})
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    FakeBotAPI.updates, FakeBotAPI.sent = [], []
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(oe, "TELEGRAM_API_BASE", f"http://127.0.0.1:{srv.server_address[1]}")
+    monkeypatch.setattr(stock_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    yield FakeBotAPI
+    srv.shutdown()
+
+
+def _write_stock(path, rows):
+    lines = ["Інгредієнти,Категорія,Боголюбова,\"Європейська, 31а\",Ліміт"] + rows
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _ask(bot, api, *texts):
+    start = len(api.updates)
+    for i, text in enumerate(texts):
+        api.updates.append({"update_id": 100 + start + i, "message": {"chat": {"id": int(CHAT)}, "text": text}})
+    api.updates.append({"update_id": 100 + len(api.updates), "message": {"chat": {"id": 7}, "text": "/missing"}})
+    sent = len(api.sent)
+    bot.poll_once(timeout=0)
+    return [m["text"] for m in api.sent[sent:]]
+
+
+def test_poll_replies_and_index_swap(api, tmp_path, monkeypatch):
+    (tmp_path / "suppliers.csv").write_text("product_name,supplier_name,pack_size\nПиво Світле,Пивзавод,1\n",
+                                            encoding="utf-8")
+    monkeypatch.setattr(tb, "SUPPLIERS_PATH", str(tmp_path / "suppliers.csv"))
+    export = tmp_path / "export_limits.csv"
+    _write_stock(export, ["Пиво Світле,Пиво,0 л,0 л,20 л", "Сидр Яблучний,Сидр,0 шт,0 шт,10 шт"])
+
+    cfg = oe.EngineConfig(telegram_bot_token=TOKEN, telegram_chat_id=CHAT, dry_run=0)
+    bot = tb.Bot(cfg=cfg, allowed_chats=[CHAT])
+    pattern = str(tmp_path / "export_limits*.*")
+    assert bot.refresh(pattern)
+    assert not bot.refresh(pattern)  # той самий файл — індекс не перебудовується
+
+    stock, order_a, order_b, missing = _ask(bot, api, "/stock світ", "/order бог", "/order 31а", "/missing")
+    assert "Пиво Світле" in stock and "ліміт 10" in stock
+    assert "Боголюбова" in order_a and "Пиво Світле — 10 л (Пивзавод)" in order_a
+    assert "Європейська, 31а" in order_b and "Пиво Світле" in order_b
+    assert "Сидр Яблучний" in missing
+    assert len(api.sent) == 4  # чат 7 не в дозволених
+    assert all(m["chat_id"] == CHAT and m["parse_mode"] == "HTML" for m in api.sent)
+    assert bot.offset == 100 + len(api.updates)
+
+    # Новий експорт -> атомарна заміна індексу
+    old = bot.holder.get()
+    _write_stock(export, ["Пиво Світле,Пиво,15 л,12 л,20 л"])
+    mtime = time.time() + 5
+    os.utime(export, (mtime, mtime))
+    assert bot.refresh(pattern)
+    assert bot.holder.get() is not old
+    stock, missing = _ask(bot, api, "/stock пиво", "/missing")
+    assert "Боголюбова: 15" in stock and "Європейська, 31а: 12" in stock
+    assert "Всі товари мають постачальника" in missing
+
+
+def test_index_respects_bot_rebalance_setting(api, tmp_path, monkeypatch):
+    (tmp_path / "suppliers.csv").write_text("product_name,supplier_name,pack_size\nПиво Світле,Пивзавод,1\n",
+                                            encoding="utf-8")
+    monkeypatch.setattr(tb, "SUPPLIERS_PATH", str(tmp_path / "suppliers.csv"))
+    monkeypatch.setattr(oe, "REBALANCE", 1)
+    _write_stock(tmp_path / "export_limits.csv", ["Пиво Світле,Пиво,0 л,20 л,20 л"])
+    pattern = str(tmp_path / "export_limits*.*")
+
+    # Надлишок Європейської покриває Боголюбову — замовляти нічого
+    bot = tb.Bot(cfg=oe.EngineConfig(telegram_bot_token=TOKEN, rebalance=1), allowed_chats=[CHAT])
+    bot.refresh(pattern)
+    assert bot.holder.get().orders[oe.STORE_A_NAME].empty
+
+    # rebalance=0 саме цього бота важливіший за глобальний REBALANCE
+    bot = tb.Bot(cfg=oe.EngineConfig(telegram_bot_token=TOKEN, rebalance=0), allowed_chats=[CHAT])
+    bot.refresh(pattern)
+    assert bot.holder.get().orders[oe.STORE_A_NAME]["Замовити"].tolist() == [10]